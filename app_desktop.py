@@ -1,11 +1,9 @@
 import streamlit as st
-import pandas as pd
 from datetime import datetime, timedelta
-from src.database_manager import DatabaseManager
-from src.fetchers.withings_fetcher import WithingsFetcher
-from src.fetchers.oura_fetcher import OuraFetcher
-from auth.withings_oauth import WithingsOAuth
-from src.utils.config_loader import load_settings
+
+# pandas やフェッチャーは重いので module トップでは import しない。
+# Streamlit は rerun のたびにスクリプト先頭を再実行するため、
+# 使うページ・関数の中で遅延 import する (cache_resource 内は初回のみ実行)。
 
 
 st.set_page_config(
@@ -17,20 +15,85 @@ st.set_page_config(
 
 @st.cache_resource
 def get_database_manager():
+    from src.database_manager import DatabaseManager
     return DatabaseManager("config/secrets.yaml")
 
 
 @st.cache_resource
 def get_withings_oauth(_db_manager):
+    from auth.withings_oauth import WithingsOAuth
     return WithingsOAuth(_db_manager)
 
 
+@st.cache_resource
+def _prewarm_oauth(_withings_oauth):
+    # cache_resource なのでプロセスにつき一度だけ走る
+    from auth.withings_oauth import WithingsOAuth
+    WithingsOAuth.prewarm([_withings_oauth])
+    return True
+
+
+@st.cache_resource
+def get_oura_fetcher(_db_manager):
+    # requests.Session の接続プールを rerun 間で使い回す
+    from src.fetchers.oura_fetcher import OuraFetcher
+    return OuraFetcher({}, db_manager=_db_manager)
+
+
 @st.cache_resource
 def get_withings_config():
+    from src.utils.config_loader import load_settings
     config = load_settings()
     return config.get("withings", {})
 
 
+# 一覧表示で使う列だけをサーバ側で射影する (raw_data の JSON blob を転送しない)
+WEIGHT_LIST_COLUMNS = ['id', 'user_id', 'measured_at', 'weight_kg', 'created_at']
+OURA_LIST_COLUMNS = ['id', 'user_id', 'measured_at', 'activity_score', 'sleep_score', 'readiness_score', 'steps', 'created_at']
+
+
+# 表示系ページはウィジェット操作のたびに rerun されるので、
+# フィルタ条件が同じならキャッシュから返して Supabase への往復を省く
+@st.cache_data(ttl=60, show_spinner=False)
+def _load_weight_data(user_id: str, limit: int):
+    return get_database_manager().get_weight_data(
+        user_id=user_id or None, limit=limit, columns=WEIGHT_LIST_COLUMNS
+    )
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _load_oura_data(user_id: str, limit: int):
+    return get_database_manager().get_oura_data(
+        user_id=user_id or None, limit=limit, columns=OURA_LIST_COLUMNS
+    )
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _load_raw_data(table: str, record_id: int):
+    return get_database_manager().get_raw_data_by_id(table, record_id)
+
+
+def _display_dataframe_paged(df, max_rows: int = 100, key: str = "page_start"):
+    """DataFrame をページ単位で表示する。
+
+    st.dataframe は rerun のたびに全行を Arrow 化してブラウザへ送るため、
+    行数が多いときはスライダーで選んだ範囲だけを描画する。
+    通常は静的 HTML の st.table で軽く描画し、ソートなどが欲しいときだけ
+    チェックボックスで Glide グリッド (st.dataframe) に切り替える。
+    """
+    if len(df) <= max_rows:
+        page_df = df
+    else:
+        start = st.slider("開始行", 0, len(df) - max_rows, 0, step=max_rows, key=key)
+        st.caption(f"{start + 1}〜{min(start + max_rows, len(df))}行目 / 全{len(df)}行")
+        page_df = df.iloc[start:start + max_rows]
+
+    if st.checkbox("インタラクティブ表示", key=f"{key}_interactive"):
+        st.dataframe(page_df, use_container_width=True, hide_index=True)
+    else:
+        st.table(page_df)
+
+
 def main():
     st.title("🏥 健康管理システム")
     st.markdown("---")
@@ -45,7 +108,10 @@ def main():
     st.sidebar.header("🔐 API連携")
     
     withings_oauth = get_withings_oauth(db_manager)
-    if withings_oauth.is_authenticated():
+    # 起動直後に一度だけトークンを温め、以後は期限間近の裏リフレッシュに任せる
+    _prewarm_oauth(withings_oauth)
+    withings_oauth.maybe_prerefresh()
+    if withings_oauth.is_authenticated_cached():
         st.sidebar.success("✅ Withings: 認証済み")
         if st.sidebar.button("🔓 Withings認証解除"):
             withings_oauth.clear_tokens()
@@ -70,7 +136,7 @@ def main():
         database_management_page(db_manager)
 
 
-def api_connection_page(db_manager: DatabaseManager):
+def api_connection_page(db_manager):
     st.header("🔐 API連携設定")
     
     tab1, tab2 = st.tabs(["Withings", "Oura Ring"])
@@ -79,8 +145,8 @@ def api_connection_page(db_manager: DatabaseManager):
         st.subheader("🏋️ Withings OAuth2 認証")
         
         withings_oauth = get_withings_oauth(db_manager)
-        
-        if withings_oauth.is_authenticated():
+
+        if withings_oauth.is_authenticated_cached():
             st.success("✅ 認証済みです")
             
             user_id = withings_oauth.get_user_id()
@@ -145,7 +211,7 @@ def api_connection_page(db_manager: DatabaseManager):
         
         if st.button("🔍 接続テスト", type="primary"):
             try:
-                oura_fetcher = OuraFetcher({}, db_manager=db_manager)
+                oura_fetcher = get_oura_fetcher(db_manager)
                 if oura_fetcher.authenticate():
                     st.success("✅ Oura Ring APIに接続できました")
                 else:
@@ -154,7 +220,7 @@ def api_connection_page(db_manager: DatabaseManager):
                 st.error(f"❌ エラー: {str(e)}")
 
 
-def show_data_page(db_manager: DatabaseManager):
+def show_data_page(db_manager):
     st.header("📊 データ表示")
     
     data_type = st.radio("データ種別", ["体重データ (Withings)", "活動データ (Oura)"], horizontal=True)
@@ -165,7 +231,12 @@ def show_data_page(db_manager: DatabaseManager):
         show_oura_data(db_manager)
 
 
-def show_weight_data(db_manager: DatabaseManager):
+# フィルタや件数の変更でスクリプト全体 (サイドバーの認証チェック等) を
+# 再実行せず、このパネルだけを rerun させる
+@st.fragment
+def show_weight_data(db_manager):
+    import pandas as pd
+
     st.subheader("🏋️ 体重データ (Withings)")
     
     col1, col2 = st.columns([3, 1])
@@ -173,51 +244,50 @@ def show_weight_data(db_manager: DatabaseManager):
     with col2:
         user_id_filter = st.text_input("ユーザーID", value="")
         limit = st.number_input("表示件数", min_value=10, max_value=1000, value=100, step=10)
-    
+        if st.button("🔄 再読込", key="reload_weight"):
+            _load_weight_data.clear()
+
     try:
-        if user_id_filter:
-            data = db_manager.get_weight_data(user_id=user_id_filter, limit=limit)
-        else:
-            data = db_manager.get_weight_data(limit=limit)
-        
+        data = _load_weight_data(user_id_filter, limit)
+
         if data:
-            df = pd.DataFrame(data)
-            
+            # columns を固定して list-of-dicts のキー走査と dtype 推測を省く
+            df = pd.DataFrame.from_records(data, columns=WEIGHT_LIST_COLUMNS)
+
             with col1:
                 st.subheader(f"📈 体重推移グラフ (直近{len(df)}件)")
                 
                 if 'measured_at' in df.columns:
-                    df['measured_at'] = pd.to_datetime(df['measured_at'])
-                    df_sorted = df.sort_values('measured_at')
-                    
+                    # ISO8601 を明示して C パーサを使う (推測パースは行ごとの dateutil 呼び出しになる)
+                    df['measured_at'] = pd.to_datetime(df['measured_at'], format="ISO8601", utc=True, errors="coerce")
+                    # df はサーバ側の measured_at DESC 順のまま保つ (テーブルと
+                    # 行選択は新しい順)。グラフ用の昇順だけ sort ではなく
+                    # O(1) の逆順ビューをその場で渡す
                     st.line_chart(
-                        df_sorted.set_index('measured_at')['weight_kg'],
+                        df.iloc[::-1].set_index('measured_at')['weight_kg'],
                         use_container_width=True
                     )
             
             st.subheader("📋 データテーブル")
             
-            display_columns = ['id', 'user_id', 'measured_at', 'weight_kg', 'created_at']
-            display_df = df[display_columns] if all(col in df.columns for col in display_columns) else df
-            
-            st.dataframe(
-                display_df,
-                use_container_width=True,
-                hide_index=True
-            )
-            
+            # from_records(columns=WEIGHT_LIST_COLUMNS) で列は確定済みなので、
+            # 欠損列だけ拾う reindex で列ごとの in 判定ループを置き換える
+            _display_dataframe_paged(df.reindex(columns=WEIGHT_LIST_COLUMNS), key="weight_page_start")
+
             st.success(f"✅ {len(data)}件のデータを表示中")
-            
+
             with st.expander("📄 生データを表示"):
-                if 'raw_data' in df.columns:
-                    selected_row = st.selectbox(
-                        "行を選択",
-                        range(len(df)),
-                        format_func=lambda x: f"ID: {df.iloc[x]['id']} - {df.iloc[x]['measured_at']}"
-                    )
-                    st.json(df.iloc[selected_row]['raw_data'])
+                # 一覧クエリには raw_data を含めず、選択された行だけ点取得する
+                selected_row = st.selectbox(
+                    "行を選択",
+                    range(len(df)),
+                    format_func=lambda x: f"ID: {df.iloc[x]['id']} - {df.iloc[x]['measured_at']}"
+                )
+                raw_data = _load_raw_data("weight_data", int(df.iloc[selected_row]['id']))
+                if raw_data is not None:
+                    st.json(raw_data)
                 else:
-                    st.info("raw_dataカラムが存在しません")
+                    st.info("raw_dataが登録されていません")
         else:
             st.warning("⚠️ データが見つかりません")
             st.info("「データ取得」メニューからダミーデータを取得してください")
@@ -227,7 +297,10 @@ def show_weight_data(db_manager: DatabaseManager):
         st.info("「データベース管理」メニューからテーブルを初期化してください")
 
 
-def show_oura_data(db_manager: DatabaseManager):
+@st.fragment
+def show_oura_data(db_manager):
+    import pandas as pd
+
     st.subheader("💍 活動データ (Oura Ring)")
     
     col1, col2 = st.columns([3, 1])
@@ -235,51 +308,44 @@ def show_oura_data(db_manager: DatabaseManager):
     with col2:
         user_id_filter = st.text_input("ユーザーID", value="")
         limit = st.number_input("表示件数", min_value=10, max_value=1000, value=100, step=10)
-    
+        if st.button("🔄 再読込", key="reload_oura"):
+            _load_oura_data.clear()
+
     try:
-        if user_id_filter:
-            data = db_manager.get_oura_data(user_id=user_id_filter, limit=limit)
-        else:
-            data = db_manager.get_oura_data(limit=limit)
-        
+        data = _load_oura_data(user_id_filter, limit)
+
         if data:
-            df = pd.DataFrame(data)
-            
+            df = pd.DataFrame.from_records(data, columns=OURA_LIST_COLUMNS)
+
             with col1:
                 st.subheader(f"📈 スコア推移グラフ (直近{len(df)}件)")
                 
                 if 'measured_at' in df.columns:
-                    df['measured_at'] = pd.to_datetime(df['measured_at'])
-                    df_sorted = df.sort_values('measured_at')
-                    
-                    chart_data = df_sorted.set_index('measured_at')[['activity_score', 'sleep_score', 'readiness_score']].dropna()
+                    df['measured_at'] = pd.to_datetime(df['measured_at'], format="ISO8601", utc=True, errors="coerce")
+
+                    chart_data = df.iloc[::-1].set_index('measured_at')[['activity_score', 'sleep_score', 'readiness_score']].dropna()
                     
                     if not chart_data.empty:
                         st.line_chart(chart_data, use_container_width=True)
             
             st.subheader("📋 データテーブル")
             
-            display_columns = ['id', 'user_id', 'measured_at', 'activity_score', 'sleep_score', 'readiness_score', 'steps', 'created_at']
-            display_df = df[display_columns] if all(col in df.columns for col in display_columns) else df
-            
-            st.dataframe(
-                display_df,
-                use_container_width=True,
-                hide_index=True
-            )
-            
+            _display_dataframe_paged(df.reindex(columns=OURA_LIST_COLUMNS), key="oura_page_start")
+
             st.success(f"✅ {len(data)}件のデータを表示中")
-            
+
             with st.expander("📄 生データを表示"):
-                if 'raw_data' in df.columns:
-                    selected_row = st.selectbox(
-                        "行を選択",
-                        range(len(df)),
-                        format_func=lambda x: f"ID: {df.iloc[x]['id']} - {df.iloc[x]['measured_at']}"
-                    )
-                    st.json(df.iloc[selected_row]['raw_data'])
+                selected_row = st.selectbox(
+                    "行を選択",
+                    range(len(df)),
+                    format_func=lambda x: f"ID: {df.iloc[x]['id']} - {df.iloc[x]['measured_at']}",
+                    key="oura_raw_row"
+                )
+                raw_data = _load_raw_data("oura_data", int(df.iloc[selected_row]['id']))
+                if raw_data is not None:
+                    st.json(raw_data)
                 else:
-                    st.info("raw_dataカラムが存在しません")
+                    st.info("raw_dataが登録されていません")
         else:
             st.warning("⚠️ データが見つかりません")
             st.info("「データ取得」メニューからOuraデータを取得してください")
@@ -289,7 +355,9 @@ def show_oura_data(db_manager: DatabaseManager):
         st.info("「データベース管理」メニューからテーブルを初期化してください")
 
 
-def fetch_data_page(db_manager: DatabaseManager):
+def fetch_data_page(db_manager):
+    from src.fetchers.withings_fetcher import WithingsFetcher
+
     st.header("🔄 データ取得")
     
     data_source = st.radio("データソース", ["Withings (体重)", "Oura Ring (活動)"], horizontal=True)
@@ -311,7 +379,7 @@ def fetch_data_page(db_manager: DatabaseManager):
     if data_source == "Withings (体重)":
         withings_oauth = get_withings_oauth(db_manager)
         
-        if not withings_oauth.is_authenticated():
+        if not withings_oauth.is_authenticated_cached():
             st.warning("⚠️ Withingsの認証が必要です。「API連携設定」メニューから認証してください。")
             return
         
@@ -328,16 +396,14 @@ def fetch_data_page(db_manager: DatabaseManager):
                     )
                     
                     if data:
+                        # 1件ずつ insert すると件数ぶん HTTPS 往復が発生するため、
+                        # バッチ単位でまとめて upsert し、進捗もバッチごとに更新する
                         progress_bar = st.progress(0)
-                        for i, record in enumerate(data):
-                            db_manager.insert_weight_data(
-                                user_id=record["user_id"],
-                                measured_at=record["measured_at"],
-                                weight_kg=record["weight_kg"],
-                                raw_data=record["raw_data"]
-                            )
-                            progress_bar.progress((i + 1) / len(data))
-                        
+                        batch_size = 500
+                        for start in range(0, len(data), batch_size):
+                            db_manager.insert_weight_data_bulk(data[start:start + batch_size])
+                            progress_bar.progress(min((start + batch_size) / len(data), 1.0))
+
                         st.success(f"✅ {len(data)}件のデータを取得・保存しました")
                         st.balloons()
                         st.info("「データ表示」メニューで確認できます")
@@ -350,7 +416,7 @@ def fetch_data_page(db_manager: DatabaseManager):
     
     else:
         try:
-            oura_fetcher = OuraFetcher({}, db_manager=db_manager)
+            oura_fetcher = get_oura_fetcher(db_manager)
             if not oura_fetcher.authenticate():
                 st.warning("⚠️ Oura Ring Personal Tokenが設定されていません。`config/secrets.yaml` に設定してください。")
                 return
@@ -361,8 +427,6 @@ def fetch_data_page(db_manager: DatabaseManager):
         if st.button("📥 Ouraデータ取得", type="primary"):
             try:
                 with st.spinner("Oura APIからデータを取得中..."):
-                    oura_fetcher = OuraFetcher({}, db_manager=db_manager)
-                    
                     data = oura_fetcher.fetch_data(
                         user_id=user_id,
                         start_date=start_date.strftime("%Y-%m-%d"),
@@ -371,19 +435,11 @@ def fetch_data_page(db_manager: DatabaseManager):
                     
                     if data:
                         progress_bar = st.progress(0)
-                        for i, record in enumerate(data):
-                            db_manager.insert_oura_data(
-                                user_id=record["user_id"],
-                                measured_at=record["measured_at"],
-                                activity_score=record.get("activity_score"),
-                                sleep_score=record.get("sleep_score"),
-                                readiness_score=record.get("readiness_score"),
-                                steps=record.get("steps"),
-                                total_sleep_duration=record.get("total_sleep_duration"),
-                                raw_data=record["raw_data"]
-                            )
-                            progress_bar.progress((i + 1) / len(data))
-                        
+                        batch_size = 500
+                        for start in range(0, len(data), batch_size):
+                            db_manager.insert_oura_data_bulk(data[start:start + batch_size])
+                            progress_bar.progress(min((start + batch_size) / len(data), 1.0))
+
                         st.success(f"✅ {len(data)}件のデータを取得・保存しました")
                         st.balloons()
                         st.info("「データ表示」メニューで確認できます")
@@ -395,7 +451,7 @@ def fetch_data_page(db_manager: DatabaseManager):
                 st.info("エラーの詳細を確認してください。Personal Tokenが正しいか確認してください。")
 
 
-def database_management_page(db_manager: DatabaseManager):
+def database_management_page(db_manager):
     st.header("🗄️ データベース管理")
     
     st.subheader("データベース情報")
@@ -442,8 +498,12 @@ def database_management_page(db_manager: DatabaseManager):
         if st.button("🗑️ 全データ削除", type="secondary"):
             if confirm == "DELETE":
                 try:
-                    db_manager.supabase.table("weight_data").delete().neq("id", 0).execute()
-                    st.success("✅ 全データを削除しました")
+                    # TRUNCATE RPC で weight_data と oura_data をまとめて破棄する
+                    # (従来は weight_data しか消えていなかった)
+                    db_manager.truncate_health_tables()
+                    _load_weight_data.clear()
+                    _load_oura_data.clear()
+                    st.success("✅ 全データを削除しました (weight_data / oura_data)")
                 except Exception as e:
                     st.error(f"❌ エラー: {str(e)}")
             else:
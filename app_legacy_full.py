@@ -584,30 +584,70 @@ def refresh_data(db_manager: DatabaseManager, user_id: str = "user_001"):
         st.error(f"❌ エラー: {str(e)}")
 
 
+def handle_oauth_callbacks(withings_oauth, google_oauth) -> None:
+    """OAuth コールバックの query_params を一度だけ読み、両プロバイダを処理する。
+
+    code が無い通常のページビューでは is_authenticated() の DB 照会ごと
+    スキップし、交換に成功したときだけ 1 回の st.rerun() で抜ける。
+    """
+    qp = dict(st.query_params)
+    auth_error = qp.get("error")
+    auth_code = qp.get("code")
+    auth_state = qp.get("state", "")
+
+    if auth_error:
+        if google_oauth.is_available():
+            google_oauth.clear_pending_oauth()
+        st.error(f"Google認証エラー: {auth_error}")
+        st.query_params.clear()
+        return
+
+    if not auth_code:
+        return
+
+    # Withings は state を "withings_" プレフィックスで発行している
+    if auth_state.startswith("withings_"):
+        if not withings_oauth.is_authenticated():
+            try:
+                withings_oauth.exchange_code_for_token(auth_code)
+                st.query_params.clear()
+                st.rerun()
+            except Exception as e:
+                st.error(f"Withings認証エラー: {e}")
+        return
+
+    if google_oauth.is_available():
+        google_oauth.ensure_credentials()
+        if not google_oauth.is_expected_state(auth_state):
+            google_oauth.clear_pending_oauth()
+            st.error("Google認証エラー: state が一致しません。Google Fit ログインをやり直してください。")
+            st.query_params.clear()
+        elif not google_oauth.is_authenticated():
+            if google_oauth.exchange_code_for_token(auth_code, state=auth_state):
+                st.query_params.clear()
+                st.rerun()
+        else:
+            # 既に認証済みの場合は callback パラメータだけ掃除する
+            st.query_params.clear()
+
+
 def main():
     st.title("💚 YuruHealth")
     
     db_manager = get_database_manager()
-    db_manager.init_tables()
 
+    # OAuth コールバックの rerun は init_tables / Gemini設定ロード / GPS より先に
+    # 処理して即 rerun する（コールバック直後のページロードを数行で済ませる）
+    if "code" in st.query_params or "error" in st.query_params:
+        handle_oauth_callbacks(get_withings_oauth(db_manager), get_google_oauth(db_manager))
+
+    db_manager.init_tables()
 
     gemini_settings = load_gemini_settings()
     
     # OAuth インスタンス
     withings_oauth = get_withings_oauth(db_manager)
     google_oauth = get_google_oauth(db_manager)
-
-    # Withings OAuth コールバック処理
-    query_params = st.query_params
-    withings_code = query_params.get("code")
-    withings_state = query_params.get("state", "")
-    if withings_code and withings_state.startswith("withings_") and not withings_oauth.is_authenticated():
-        try:
-            withings_oauth.exchange_code_for_token(withings_code)
-            st.query_params.clear()
-            st.rerun()
-        except Exception as e:
-            st.error(f"Withings認証エラー: {e}")
     
     # GPS位置情報の取得（session_stateで再リロードループを防止）
     if GEOLOCATION_AVAILABLE and "gps_requested" not in st.session_state:
@@ -758,31 +798,6 @@ def main():
     else:
         st.info("まだデータがありません。🔄 ボタンでデータを取得してみましょう。")
 
-    # Google OAuth コールバック処理
-    if google_oauth.is_available():
-        google_oauth.ensure_credentials()
-        query_params = st.query_params
-        auth_error = query_params.get("error")
-        auth_code = query_params.get("code")
-        auth_state = query_params.get("state")
-
-        if auth_error:
-            google_oauth.clear_pending_oauth()
-            st.error(f"Google認証エラー: {auth_error}")
-            st.query_params.clear()
-        elif auth_code:
-            if not google_oauth.is_expected_state(auth_state):
-                google_oauth.clear_pending_oauth()
-                st.error("Google認証エラー: state が一致しません。Google Fit ログインをやり直してください。")
-                st.query_params.clear()
-            elif not google_oauth.is_authenticated():
-                if google_oauth.exchange_code_for_token(auth_code, state=auth_state):
-                    st.query_params.clear()
-                    st.rerun()
-            else:
-                # 既に認証済みの場合は callback パラメータだけ掃除する
-                st.query_params.clear()
-
     # ── タブ化 UI ──
     tab_summary, tab_intake, tab_sleep, tab_weight, tab_env, tab_server = st.tabs([
         "📊 サマリー",
@@ -1,14 +1,12 @@
+import hashlib
+import json
 import streamlit as st
-import pandas as pd
 from datetime import datetime, timedelta
-from src.database_manager import DatabaseManager
-from src.fetchers.withings_fetcher import WithingsFetcher
-from src.fetchers.oura_fetcher import OuraFetcher
-from src.fetchers.weather_fetcher import WeatherFetcher
-from auth.withings_oauth import WithingsOAuth
-from src.evaluators.gemini_evaluator import GeminiEvaluator
 from src.utils.config_loader import load_settings
 
+# pandas / fetchers / OAuth / evaluator はコールドスタート短縮のため
+# 使用するパスで遅延インポートする（pandas だけで数百msかかる）
+
 try:
     from streamlit_js_eval import get_geolocation
     GEOLOCATION_AVAILABLE = True
@@ -26,11 +24,13 @@ st.set_page_config(
 
 @st.cache_resource
 def get_database_manager():
+    from src.database_manager import DatabaseManager
     return DatabaseManager("config/secrets.yaml")
 
 
 @st.cache_resource
 def get_withings_oauth(_db_manager):
+    from auth.withings_oauth import WithingsOAuth
     return WithingsOAuth(_db_manager)
 
 
@@ -45,31 +45,54 @@ def load_gemini_settings():
 
 @st.cache_resource
 def get_gemini_evaluator(model_name: str):
+    from src.evaluators.gemini_evaluator import GeminiEvaluator
     return GeminiEvaluator({}, model_name=model_name)
 
 
 def get_weather_fetcher(db_manager=None):
+    from src.fetchers.weather_fetcher import WeatherFetcher
     return WeatherFetcher(db_manager=db_manager)
 
 
-def fetch_latest_data(db_manager: DatabaseManager, user_id: str = "user_001"):
-    """最新の健康データを取得"""
-    weight_data = db_manager.get_weight_data(user_id=user_id, limit=30)
-    oura_data = db_manager.get_oura_data(user_id=user_id, limit=30)
-    
+def _weight_rows_to_columns(weight_data):
+    """取得済みの体重行リストを列指向 (SoA) の NumPy 配列に変換する"""
+    if not weight_data:
+        return None
+    import numpy as np
+
+    rows = [r for r in weight_data if r.get("weight_kg") is not None]
+    return {
+        "measured_at": np.array([str(r.get("measured_at") or "") for r in rows]),
+        "weight_kg": np.fromiter((float(r["weight_kg"]) for r in rows), dtype=np.float64),
+    }
+
+
+def fetch_latest_data(db_manager, user_id: str = "user_001", limit: int = 7):
+    """最新の健康データを取得（通常パスはAI評価に必要な7日分のみ）"""
+    weight_data = db_manager.get_weight_data(user_id=user_id, limit=limit)
+    oura_data = db_manager.get_oura_data(user_id=user_id, limit=limit)
+
+    # SoA 列は取得済みの weight_data から 1 パスで組み立てる。
+    # get_weight_columns を呼ぶと同じ行をもう 1 往復で引き直してしまう
+    weight_cols = _weight_rows_to_columns(weight_data)
+
     latest_weight = weight_data[0] if weight_data else None
     latest_oura = oura_data[0] if oura_data else None
     
     return {
         "weight_data": weight_data,
+        "weight_cols": weight_cols,
         "oura_data": oura_data,
         "latest_weight": latest_weight,
         "latest_oura": latest_oura
     }
 
 
-def refresh_data(db_manager: DatabaseManager, user_id: str = "user_001"):
+def refresh_data(db_manager, user_id: str = "user_001"):
     """データを更新"""
+    from src.fetchers.oura_fetcher import OuraFetcher
+    from src.fetchers.withings_fetcher import WithingsFetcher
+
     try:
         with st.spinner("データを更新中..."):
             end_dt = datetime.now()
@@ -150,11 +173,40 @@ def refresh_data(db_manager: DatabaseManager, user_id: str = "user_001"):
         st.error(f"❌ エラー: {str(e)}")
 
 
+@st.cache_data(ttl=3600, show_spinner="AIが分析中...")
+def _cached_ai_evaluation(model_name: str, data_digest: str, _evaluation_data: dict) -> str:
+    """AI評価をデータ内容のダイジェストをキーにキャッシュする。
+
+    同一データでの rerun は Gemini API を呼ばずにキャッシュを返す。
+    _evaluation_data は digest でキー済みのためハッシュ対象から除外。
+    """
+    evaluator = get_gemini_evaluator(model_name)
+    return evaluator.evaluate(_evaluation_data, mode="witty")
+
+
+def _evaluation_digest(evaluation_data: dict) -> str:
+    """評価対象データの安定ダイジェスト（キャッシュキー用）"""
+    canonical = json.dumps(evaluation_data, sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+@st.cache_data(ttl=60)
+def _cached_consultation_prompt(latest_weight, latest_oura, weight_7d, weight_cols=None) -> str:
+    """相談プロンプトをキャッシュ付きで生成（rerun ごとの再構築を防ぐ）"""
+    return generate_consultation_prompt({
+        "latest_weight": latest_weight,
+        "latest_oura": latest_oura,
+        "weight_data": weight_7d,
+        "weight_cols": weight_cols,
+    })
+
+
 def generate_consultation_prompt(data: dict) -> str:
     """Gemini相談用プロンプトを生成"""
     latest_weight = data.get("latest_weight")
     latest_oura = data.get("latest_oura")
     weight_data = data.get("weight_data", [])
+    weight_cols = data.get("weight_cols")
     
     prompt_parts = ["# 健康データサマリー\n"]
     
@@ -162,7 +214,11 @@ def generate_consultation_prompt(data: dict) -> str:
     if latest_weight:
         prompt_parts.append(f"## 体重")
         prompt_parts.append(f"- 最新: {latest_weight.get('weight_kg', 'N/A')}kg ({latest_weight.get('measured_at', 'N/A')})")
-        if len(weight_data) >= 7:
+        # SoA 列があれば NumPy の C ループで平均を計算する
+        if weight_cols is not None and len(weight_cols["weight_kg"]) >= 7:
+            avg_7d = float(weight_cols["weight_kg"][:7].mean())
+            prompt_parts.append(f"- 7日平均: {avg_7d:.1f}kg")
+        elif len(weight_data) >= 7:
             avg_7d = sum(w.get('weight_kg', 0) for w in weight_data[:7]) / 7
             prompt_parts.append(f"- 7日平均: {avg_7d:.1f}kg")
         prompt_parts.append("")
@@ -236,14 +292,19 @@ def main():
         evaluator = get_gemini_evaluator(model_name)
         
         if evaluator.is_available() and (latest_weight or latest_oura):
-            with st.spinner("AIが分析中..."):
-                evaluation_data = {
-                    "weight_data": data["weight_data"][:7],
-                    "oura_data": data["oura_data"][:7]
-                }
-                ai_comment = evaluator.evaluate(evaluation_data, mode="witty")
-            
-            st.info(ai_comment)
+            evaluation_data = {
+                "weight_data": data["weight_data"][:7],
+                "oura_data": data["oura_data"][:7]
+            }
+            data_digest = _evaluation_digest(evaluation_data)
+            # 初回は明示的なボタン操作で実行（起動だけで有料APIを呼ばない）
+            requested = st.button("🤖 AI評価を更新")
+            if requested or st.session_state.get("ai_eval_digest") == data_digest:
+                ai_comment = _cached_ai_evaluation(model_name, data_digest, evaluation_data)
+                st.session_state["ai_eval_digest"] = data_digest
+                st.info(ai_comment)
+            else:
+                st.caption("「AI評価を更新」を押すと最新データで分析します")
         else:
             st.warning("⚠️ AI評価を利用するには、Gemini APIキーの設定とデータが必要です")
     
@@ -252,60 +313,27 @@ def main():
     # メトリクス表示（大きく）
     st.subheader("📊 今日の記録")
     
-    col1, col2, col3 = st.columns(3)
-    
-    with col1:
-        if latest_oura and latest_oura.get('sleep_score'):
-            st.metric(
-                label="😴 睡眠",
-                value=f"{latest_oura.get('sleep_score')}点",
-                delta=None
-            )
-        else:
-            st.metric(label="😴 睡眠", value="--")
-    
-    with col2:
-        if latest_oura and latest_oura.get('steps'):
-            steps = latest_oura.get('steps')
-            st.metric(
-                label="🚶 歩数",
-                value=f"{steps:,}歩",
-                delta=None
-            )
-        else:
-            st.metric(label="🚶 歩数", value="--")
-    
-    with col3:
-        if latest_weight and latest_weight.get('weight_kg'):
-            weight = latest_weight.get('weight_kg')
-            st.metric(
-                label="⚖️ 体重",
-                value=f"{weight}kg",
-                delta=None
-            )
-        else:
-            st.metric(label="⚖️ 体重", value="--")
-    
-    # 追加メトリクス
-    col4, col5 = st.columns(2)
-    
-    with col4:
-        if latest_oura and latest_oura.get('activity_score'):
-            st.metric(
-                label="🏃 活動",
-                value=f"{latest_oura.get('activity_score')}点"
-            )
-        else:
-            st.metric(label="🏃 活動", value="--")
-    
-    with col5:
-        if latest_oura and latest_oura.get('readiness_score'):
-            st.metric(
-                label="💪 コンディション",
-                value=f"{latest_oura.get('readiness_score')}点"
-            )
-        else:
-            st.metric(label="💪 コンディション", value="--")
+    # 表示値を一度だけ組み立てる（カラムごとの .get() チェーンを排除）
+    metric_values = {
+        "sleep": latest_oura.get("sleep_score") if latest_oura else None,
+        "steps": latest_oura.get("steps") if latest_oura else None,
+        "weight": latest_weight.get("weight_kg") if latest_weight else None,
+        "activity": latest_oura.get("activity_score") if latest_oura else None,
+        "readiness": latest_oura.get("readiness_score") if latest_oura else None,
+    }
+    metric_labels = [
+        ("sleep", "😴 睡眠", "{}点"),
+        ("steps", "🚶 歩数", "{:,}歩"),
+        ("weight", "⚖️ 体重", "{}kg"),
+        ("activity", "🏃 活動", "{}点"),
+        ("readiness", "💪 コンディション", "{}点"),
+    ]
+
+    cols = st.columns(3) + st.columns(2)
+    for col, (key, label, fmt) in zip(cols, metric_labels):
+        with col:
+            value = metric_values[key]
+            st.metric(label=label, value=fmt.format(value) if value else "--")
     
     st.markdown("---")
     
@@ -313,61 +341,70 @@ def main():
     with st.expander("💬 Geminiに相談する", expanded=False):
         st.markdown("最新データを要約したテキストです。コピーしてGeminiに貼り付けてください。")
         
-        consultation_prompt = generate_consultation_prompt(data)
+        consultation_prompt = _cached_consultation_prompt(
+            latest_weight, latest_oura, data["weight_data"][:7], data.get("weight_cols")
+        )
         st.code(consultation_prompt, language="text")
         
         st.caption("💡 [Gemini](https://gemini.google.com/)で相談する")
     
     # 詳細データ（エキスパンダー）
+    # 30日分のフェッチはチェックボックスを入れたときだけ実行する
     with st.expander("📈 詳細データ", expanded=False):
-        tab1, tab2 = st.tabs(["体重", "Oura"])
-        
-        with tab1:
-            st.subheader("体重データ")
-            weight_data = data["weight_data"]
-            
-            if weight_data:
-                df = pd.DataFrame(weight_data)
-                df['measured_at'] = pd.to_datetime(df['measured_at'])
-                df = df.sort_values('measured_at', ascending=False)
-                
-                st.line_chart(
-                    df.set_index('measured_at')['weight_kg'],
-                    use_container_width=True
-                )
-                
-                st.dataframe(
-                    df[['measured_at', 'weight_kg']].head(10),
-                    use_container_width=True,
-                    hide_index=True
-                )
-            else:
-                st.info("データがありません")
-        
-        with tab2:
-            st.subheader("Oura Ringデータ")
-            oura_data = data["oura_data"]
-            
-            if oura_data:
-                df = pd.DataFrame(oura_data)
-                df['measured_at'] = pd.to_datetime(df['measured_at'])
-                df = df.sort_values('measured_at', ascending=False)
-                
-                # スコアチャート
-                score_cols = ['sleep_score', 'activity_score', 'readiness_score']
-                if all(col in df.columns for col in score_cols):
+        if not st.checkbox("詳細データを読み込む", key="show_detail_data"):
+            st.caption("チェックを入れると過去30日分のデータを読み込みます")
+        else:
+            import pandas as pd
+
+            detail_data = fetch_latest_data(db_manager, limit=30)
+            tab1, tab2 = st.tabs(["体重", "Oura"])
+
+            with tab1:
+                st.subheader("体重データ")
+                weight_data = detail_data["weight_data"]
+
+                if weight_data:
+                    df = pd.DataFrame(weight_data)
+                    df['measured_at'] = pd.to_datetime(df['measured_at'])
+                    df = df.sort_values('measured_at', ascending=False)
+
                     st.line_chart(
-                        df.set_index('measured_at')[score_cols],
+                        df.set_index('measured_at')['weight_kg'],
                         use_container_width=True
                     )
-                
-                st.dataframe(
-                    df[['measured_at', 'sleep_score', 'activity_score', 'readiness_score', 'steps']].head(10),
-                    use_container_width=True,
-                    hide_index=True
-                )
-            else:
-                st.info("データがありません")
+
+                    st.dataframe(
+                        df[['measured_at', 'weight_kg']].head(10),
+                        use_container_width=True,
+                        hide_index=True
+                    )
+                else:
+                    st.info("データがありません")
+
+            with tab2:
+                st.subheader("Oura Ringデータ")
+                oura_data = detail_data["oura_data"]
+
+                if oura_data:
+                    df = pd.DataFrame(oura_data)
+                    df['measured_at'] = pd.to_datetime(df['measured_at'])
+                    df = df.sort_values('measured_at', ascending=False)
+
+                    # スコアチャート
+                    score_cols = ['sleep_score', 'activity_score', 'readiness_score']
+                    if all(col in df.columns for col in score_cols):
+                        st.line_chart(
+                            df.set_index('measured_at')[score_cols],
+                            use_container_width=True
+                        )
+
+                    st.dataframe(
+                        df[['measured_at', 'sleep_score', 'activity_score', 'readiness_score', 'steps']].head(10),
+                        use_container_width=True,
+                        hide_index=True
+                    )
+                else:
+                    st.info("データがありません")
     
     # 設定（サイドバー - 折りたたみ）
     with st.sidebar:
@@ -2,6 +2,7 @@ import logging
 import base64
 import hashlib
 import secrets
+import threading
 from datetime import datetime, timedelta, timezone
 import streamlit as st
 from typing import Dict, Any, Optional
@@ -10,14 +11,18 @@ from auth.exceptions import OAuthRefreshError
 
 logger = logging.getLogger(__name__)
 
+__all__ = ["GoogleOAuth"]
+
 try:
-    from google_auth_oauthlib.flow import Flow
     from google.oauth2.credentials import Credentials
     from google.auth.transport.requests import Request
     GOOGLE_AUTH_AVAILABLE = True
 except ImportError:
     GOOGLE_AUTH_AVAILABLE = False
 
+# Flow (google_auth_oauthlib) は認証フロー実行時しか使わない重い import なので、
+# get_authorization_url / exchange_code_for_token 内で遅延 import する
+
 
 class GoogleOAuth:
     SCOPES = [
@@ -29,7 +34,9 @@ class GoogleOAuth:
     OAUTH_PENDING_KEY = "google_oauth_pending"
     OAUTH_PENDING_PROVIDER = "google_pkce_pending"
     OAUTH_PENDING_TTL_MINUTES = 15
-    
+    # 期限のこの秒数前からバックグラウンドで先行リフレッシュする
+    REFRESH_MARGIN_SECONDS = 300
+
     def __init__(self, db_manager, secrets_path: str = "config/secrets.yaml", user_id: str = "user_001"):
         self.db_manager = db_manager
         self.user_id = user_id
@@ -38,10 +45,14 @@ class GoogleOAuth:
         self.client_id = self.google_config.get("client_id", "")
         self.client_secret = self.google_config.get("client_secret", "")
         self.redirect_uris = self.google_config.get("redirect_uris", [])
+        self._redirect_uri: Optional[str] = None
         self._restore_credentials()
     
     def _credentials_to_dict(self, creds: "Credentials") -> Dict[str, Any]:
         """Credentials オブジェクトを dict に変換"""
+        # expiry も保存する。無いと復元直後のトークンが常に「期限切れ」扱いになり、
+        # セッションごとに不要なリフレッシュ往復が走る。
+        expiry = getattr(creds, "expiry", None)
         return {
             "token": creds.token,
             "refresh_token": creds.refresh_token,
@@ -49,6 +60,7 @@ class GoogleOAuth:
             "client_id": creds.client_id,
             "client_secret": creds.client_secret,
             "scopes": list(creds.scopes) if creds.scopes else self.SCOPES,
+            "expiry": expiry.isoformat() if expiry else None,
         }
     
     def _dict_to_credentials(self, data: Dict[str, Any]) -> Optional["Credentials"]:
@@ -56,7 +68,7 @@ class GoogleOAuth:
         if not GOOGLE_AUTH_AVAILABLE or not data:
             return None
         try:
-            return Credentials(
+            creds = Credentials(
                 token=data.get("token"),
                 refresh_token=data.get("refresh_token"),
                 token_uri=data.get("token_uri", "https://oauth2.googleapis.com/token"),
@@ -64,6 +76,14 @@ class GoogleOAuth:
                 client_secret=data.get("client_secret", self.client_secret),
                 scopes=data.get("scopes", self.SCOPES),
             )
+            expiry = data.get("expiry")
+            if expiry:
+                # google-auth は naive UTC の expiry を期待する
+                expiry_dt = datetime.fromisoformat(str(expiry))
+                if expiry_dt.tzinfo is not None:
+                    expiry_dt = expiry_dt.astimezone(timezone.utc).replace(tzinfo=None)
+                creds.expiry = expiry_dt
+            return creds
         except Exception:
             return None
     
@@ -117,8 +137,11 @@ class GoogleOAuth:
             return
         
         if creds.valid:
+            # まだ有効だが期限が近いなら、rerun をブロックせずに裏で先行リフレッシュ。
+            # 実際に切れてから同期リフレッシュすると描画がトークン往復ぶん止まる。
+            self._maybe_prerefresh(creds)
             return
-        
+
         if creds.expired and creds.refresh_token:
             try:
                 creds.refresh(Request())
@@ -131,6 +154,33 @@ class GoogleOAuth:
                     raise OAuthRefreshError(f"Google token refresh failed: {e}") from e
                 return
     
+    def _maybe_prerefresh(self, creds: "Credentials") -> None:
+        """期限 REFRESH_MARGIN_SECONDS 以内のトークンをバックグラウンドで更新する"""
+        expiry = getattr(creds, "expiry", None)
+        if expiry is None or not creds.refresh_token:
+            return
+        # google-auth の expiry は naive UTC
+        remaining = (expiry - datetime.utcnow()).total_seconds()
+        if remaining >= self.REFRESH_MARGIN_SECONDS:
+            st.session_state.pop("google_refresh_in_flight", None)
+            return
+        if remaining <= 0 or st.session_state.get("google_refresh_in_flight"):
+            return
+        st.session_state["google_refresh_in_flight"] = True
+
+        def _worker():
+            # creds.refresh はオブジェクトを in-place 更新するので、
+            # session_state 側の参照はそのまま新トークンを指す。
+            # スレッド内では st API に触れず DB 保存だけ行う。
+            try:
+                creds.refresh(Request())
+                self.db_manager.save_token(self.user_id, self.PROVIDER, self._credentials_to_dict(creds))
+                logger.info("Google credentials pre-refreshed in background")
+            except Exception as e:
+                logger.info(f"Google background token refresh failed: {e}")
+
+        threading.Thread(target=_worker, daemon=True).start()
+
     def _save_credentials(self, creds: "Credentials"):
         """Credentials を Supabase と session_state に保存"""
         st.session_state["google_credentials"] = creds
@@ -208,7 +258,13 @@ class GoogleOAuth:
         return bool(pending and state and state == pending.get("state"))
     
     def _get_redirect_uri(self) -> str:
-        """現在の環境に合ったリダイレクトURIを返す"""
+        """現在の環境に合ったリダイレクトURIを返す (インスタンスごとに一度だけ判定)"""
+        if self._redirect_uri is None:
+            self._redirect_uri = self._compute_redirect_uri()
+        return self._redirect_uri
+
+    def _compute_redirect_uri(self) -> str:
+        """ヘッダと設定から適切なリダイレクトURIを選択する"""
         try:
             # Streamlit Cloud の場合、実際のURLを使用
             if hasattr(st, "context") and hasattr(st.context, "headers"):
@@ -299,6 +355,7 @@ class GoogleOAuth:
         """認証URLを生成"""
         if not self.is_available():
             return ""
+        from google_auth_oauthlib.flow import Flow
 
         pending = self._get_pending_oauth()
         if pending:
@@ -337,6 +394,8 @@ class GoogleOAuth:
         if not GOOGLE_AUTH_AVAILABLE:
             return False
         try:
+            from google_auth_oauthlib.flow import Flow
+
             pending = self._get_pending_oauth()
             if not pending:
                 raise RuntimeError("認証セッションが見つかりません。Google Fit ログインをやり直してください。")
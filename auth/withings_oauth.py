@@ -1,18 +1,109 @@
+import atexit
+import threading
+import time
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor
+
 import requests
-from typing import Dict, Any, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta, timezone
-from urllib.parse import urlencode
+from urllib.parse import quote, urlencode
+from src.utils import oauth_cache
 from src.utils.secrets_loader import load_secrets
 from auth.exceptions import OAuthRefreshError
 
 JST = timezone(timedelta(hours=9))
 
+# トークンエンドポイントへの短い HTTPS POST は TCP+TLS ハンドシェイクが
+# レイテンシの大半を占めるため、モジュール共有の Session で接続を使い回す
+_SESSION = requests.Session()
+_SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=8,
+        max_retries=Retry(total=3, backoff_factor=0.2, status_forcelist=[502, 503, 504]),
+    ),
+)
+# (connect, read) タイムアウト
+_TIMEOUT = (3.05, 10)
+_POST_HEADERS = {"Accept": "application/json", "Accept-Encoding": "gzip"}
+# 事前 urlencode 済みのボディ文字列を送るときに使う
+_FORM_HEADERS = {**_POST_HEADERS, "Content-Type": "application/x-www-form-urlencoded"}
+
+
+def _parse_json(response: requests.Response) -> Dict[str, Any]:
+    """response.json() の charset 推測と中間 str 生成を避けて bytes を直接パースする。"""
+    if orjson is not None:
+        return orjson.loads(response.content)
+    return response.json()
+
+# single-flight: 同一 (provider, user) の同時リフレッシュを1本の POST に束ねる
+_REFRESH_FUTURES_LOCK = threading.Lock()
+_REFRESH_FUTURES: Dict[str, Future] = {}
+
+# atexit はコールバックごとに強参照を保持するため、インスタンスごとに
+# register するとセッションやボタン押下のたびに作られるインスタンスが
+# プロセス終了まで解放されない。生存中のインスタンスは WeakSet で追跡し、
+# モジュールレベルの 1 フックでまとめて flush する
+_LIVE_INSTANCES: "weakref.WeakSet[WithingsOAuth]" = weakref.WeakSet()
+
+
+def _flush_all_pending_tokens() -> None:
+    """プロセス終了時に未書き込みのトークンを全インスタンス分永続化する"""
+    for oauth in list(_LIVE_INSTANCES):
+        try:
+            oauth._flush_pending_tokens()
+        except Exception:
+            pass
+
+
+atexit.register(_flush_all_pending_tokens)
+
 
 class WithingsOAuth:
     AUTH_URL = "https://account.withings.com/oauth2_user/authorize2"
     TOKEN_URL = "https://wbsapi.withings.net/v2/oauth2"
     PROVIDER = "withings"
-    
+    # is_authenticated_cached が認証状態を再確認するまでの秒数
+    AUTH_CACHE_TTL_SECONDS = 30
+    # 期限のこの秒数前からバックグラウンドで先行リフレッシュする
+    REFRESH_MARGIN_SECONDS = 300
+    # 連続したトークン保存をこの秒数だけ合流させてから Supabase に書く
+    SAVE_DEBOUNCE_SECONDS = 0.2
+
+    # インスタンスごとの __dict__ を持たず、属性アクセスも速くする
+    __slots__ = (
+        # _LIVE_INSTANCES (WeakSet) から弱参照を張れるようにする
+        "__weakref__",
+        "db_manager",
+        "user_id",
+        "secrets",
+        "client_id",
+        "client_secret",
+        "redirect_uri",
+        "_refresh_prefix",
+        "_auth_base",
+        "_cache_key",
+        "_expiry_monotonic",
+        "tokens",
+        "_auth_cache",
+        "_auth_cache_ts",
+        "_refresh_lock",
+        "_last_refresh_failed",
+        "_pending_tokens",
+        "_pending_lock",
+        "_save_timer",
+    )
+
     def __init__(self, db_manager, secrets_path: str = "config/secrets.yaml", user_id: str = "user_001"):
         self.db_manager = db_manager
         self.user_id = user_id
@@ -21,27 +112,97 @@ class WithingsOAuth:
         self.client_id = withings_config.get("client_id", "")
         self.client_secret = withings_config.get("client_secret", "")
         self.redirect_uri = withings_config.get("redirect_uri", "")
-        self.tokens = self._load_tokens()
-    
+        # リフレッシュ POST の固定 4 フィールドは一度だけ urlencode しておく
+        # (可変なのは refresh_token だけで、ローテーションまで変わらない)
+        self._refresh_prefix = urlencode({
+            "action": "requesttoken",
+            "grant_type": "refresh_token",
+            "client_id": self.client_id,
+            "client_secret": self.client_secret,
+        })
+        # state 以外のクエリは固定なので認可 URL のベースも前計算しておく
+        self._auth_base = f"{self.AUTH_URL}?" + urlencode({
+            "response_type": "code",
+            "client_id": self.client_id,
+            "redirect_uri": self.redirect_uri,
+            "scope": "user.metrics",
+        })
+        self._cache_key = oauth_cache.make_key(self.PROVIDER, user_id, self.client_id)
+        self._expiry_monotonic: Optional[float] = None
+        self._set_tokens(self._load_tokens())
+        self._auth_cache: Optional[bool] = None
+        self._auth_cache_ts = 0.0
+        self._refresh_lock = threading.Lock()
+        self._last_refresh_failed = False
+        self._pending_tokens: Optional[Dict[str, Any]] = None
+        self._pending_lock = threading.Lock()
+        self._save_timer: Optional[threading.Timer] = None
+        # プロセス終了時のトークン永続化はモジュールレベルの atexit フック
+        # (_flush_all_pending_tokens) が WeakSet 経由で行う
+        _LIVE_INSTANCES.add(self)
+
+    def _set_tokens(self, tokens: Dict[str, Any]) -> None:
+        """self.tokens を更新し、monotonic の期限デッドラインを前計算する。
+
+        ホットパスの expires_in() が呼びのたびに ISO 文字列をパースして
+        aware datetime を組み立てなくて済むようにするため。
+        """
+        self.tokens = tokens
+        remaining = self._remaining_seconds(tokens)
+        self._expiry_monotonic = None if remaining is None else time.monotonic() + remaining
+
     def _load_tokens(self) -> Dict[str, Any]:
-        """Supabase からトークンを読み込む"""
+        """プロセス内キャッシュ経由で Supabase からトークンを読み込む"""
+        cached = oauth_cache.get(self._cache_key)
+        if cached is not None:
+            return dict(cached)
         try:
             token_data = self.db_manager.get_token(self.user_id, self.PROVIDER)
-            return token_data if token_data else {}
         except Exception:
             return {}
-    
+        tokens = token_data if token_data else {}
+        if tokens:
+            oauth_cache.put(self._cache_key, tokens, self._remaining_seconds(tokens))
+        return tokens
+
     def _save_tokens(self, tokens: Dict[str, Any]):
-        """Supabase にトークンを保存する"""
+        """トークンを保持し、Supabase への書き込みはデバウンスして行う。
+
+        リフレッシュが立て続けに起きても最終状態だけが 1 回の
+        save_token になる。呼び出し元は Supabase のレイテンシを待たない。
+        内容が変わらなければ何もしない。
+        """
+        if tokens == self.tokens:
+            return
+        with self._pending_lock:
+            self._pending_tokens = tokens
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+            self._save_timer = threading.Timer(self.SAVE_DEBOUNCE_SECONDS, self._flush_pending_tokens)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+        self._set_tokens(tokens)
+        oauth_cache.put(self._cache_key, tokens, self._remaining_seconds(tokens))
+        self._invalidate_auth_cache()
+
+    def _flush_pending_tokens(self):
+        """デバウンス中の最新トークンを Supabase に書き出す。"""
+        with self._pending_lock:
+            tokens = self._pending_tokens
+            self._pending_tokens = None
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+        if tokens is None:
+            return
         try:
             self.db_manager.save_token(self.user_id, self.PROVIDER, tokens)
         except Exception:
             pass
-        self.tokens = tokens
 
     def sync_tokens_from_db(self):
         """Supabase の最新トークン状態を self.tokens に同期する。"""
-        self.tokens = self._load_tokens()
+        self._set_tokens(self._load_tokens())
 
     def has_saved_token(self) -> bool:
         """oauth_tokens に Withings トークンが存在するかを返す。"""
@@ -50,15 +211,38 @@ class WithingsOAuth:
         except Exception:
             return False
     
-    def get_authorization_url(self, state: str = "random_state") -> str:
-        params = {
-            "response_type": "code",
-            "client_id": self.client_id,
-            "redirect_uri": self.redirect_uri,
-            "scope": "user.metrics",
-            "state": state
+    @classmethod
+    def prewarm(cls, oauths: List["WithingsOAuth"]) -> None:
+        """起動時にトークン検証・リフレッシュを裏で済ませておく。
+
+        最初の「データ取得」クリックに TLS ハンドシェイク + リフレッシュの
+        全コストを払わせず、アプリ起動直後の空き時間に移す。結果は待たない。
+        """
+        targets = [o for o in oauths if o is not None]
+        if not targets:
+            return
+        executor = ThreadPoolExecutor(max_workers=len(targets))
+        for oauth in targets:
+            executor.submit(oauth.get_valid_access_token)
+        executor.shutdown(wait=False)
+
+    @staticmethod
+    def _build_token_dict(body: Dict[str, Any]) -> Dict[str, Any]:
+        """トークンエンドポイントのレスポンス body から保存用 dict を組み立てる。"""
+        now = datetime.now(JST)
+        return {
+            "access_token": body.get("access_token"),
+            "refresh_token": body.get("refresh_token"),
+            "expires_in": body.get("expires_in"),
+            "token_type": body.get("token_type"),
+            "scope": body.get("scope"),
+            "user_id": body.get("userid"),
+            "created_at": now.isoformat(),
+            "expires_at": (now + timedelta(seconds=body.get("expires_in") or 10800)).isoformat(),
         }
-        return f"{self.AUTH_URL}?{urlencode(params)}"
+
+    def get_authorization_url(self, state: str = "random_state") -> str:
+        return f"{self._auth_base}&state={quote(state)}"
     
     def exchange_code_for_token(self, code: str) -> Dict[str, Any]:
         data = {
@@ -70,62 +254,118 @@ class WithingsOAuth:
             "redirect_uri": self.redirect_uri
         }
         
-        response = requests.post(self.TOKEN_URL, data=data)
+        response = _SESSION.post(self.TOKEN_URL, data=data, headers=_POST_HEADERS, timeout=_TIMEOUT)
         response.raise_for_status()
         
-        result = response.json()
+        result = _parse_json(response)
         
         if result.get("status") == 0:
-            body = result.get("body", {})
-            tokens = {
-                "access_token": body.get("access_token"),
-                "refresh_token": body.get("refresh_token"),
-                "expires_in": body.get("expires_in"),
-                "token_type": body.get("token_type"),
-                "scope": body.get("scope"),
-                "user_id": body.get("userid"),
-                "created_at": datetime.now(JST).isoformat(),
-                "expires_at": (datetime.now(JST) + timedelta(seconds=body.get("expires_in", 10800))).isoformat()
-            }
+            tokens = self._build_token_dict(result.get("body", {}))
             self._save_tokens(tokens)
             return tokens
         else:
             raise Exception(f"Token exchange failed: {result}")
     
     def refresh_access_token(self) -> Dict[str, Any]:
+        """アクセストークンをリフレッシュする (single-flight)。
+
+        同じユーザーのリフレッシュが既に進行中なら POST を重ねず、
+        その結果を待って共有する。refresh_token のローテーション競合と
+        トークンエンドポイントへの無駄な負荷を避けるため。
+        """
+        key = f"{self.PROVIDER}:{self.user_id}"
+        with _REFRESH_FUTURES_LOCK:
+            future = _REFRESH_FUTURES.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                _REFRESH_FUTURES[key] = future
+
+        if not is_leader:
+            tokens = future.result()
+            self._set_tokens(tokens)
+            self._invalidate_auth_cache()
+            return tokens
+
+        try:
+            tokens = self._do_refresh()
+            future.set_result(tokens)
+            return tokens
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with _REFRESH_FUTURES_LOCK:
+                _REFRESH_FUTURES.pop(key, None)
+
+    def _do_refresh(self) -> Dict[str, Any]:
         if not self.tokens.get("refresh_token"):
             raise Exception("No refresh token available")
-        
-        data = {
-            "action": "requesttoken",
-            "grant_type": "refresh_token",
-            "client_id": self.client_id,
-            "client_secret": self.client_secret,
-            "refresh_token": self.tokens["refresh_token"]
-        }
-        
-        response = requests.post(self.TOKEN_URL, data=data)
+
+        body = f"{self._refresh_prefix}&refresh_token={quote(self.tokens['refresh_token'])}"
+
+        response = _SESSION.post(self.TOKEN_URL, data=body, headers=_FORM_HEADERS, timeout=_TIMEOUT)
         response.raise_for_status()
         
-        result = response.json()
+        result = _parse_json(response)
         
         if result.get("status") == 0:
-            body = result.get("body", {})
-            tokens = {
-                "access_token": body.get("access_token"),
-                "refresh_token": body.get("refresh_token"),
-                "expires_in": body.get("expires_in"),
-                "token_type": body.get("token_type"),
-                "scope": body.get("scope"),
-                "user_id": body.get("userid"),
-                "created_at": datetime.now(JST).isoformat(),
-                "expires_at": (datetime.now(JST) + timedelta(seconds=body.get("expires_in", 10800))).isoformat()
-            }
+            tokens = self._build_token_dict(result.get("body", {}))
             self._save_tokens(tokens)
             return tokens
         else:
             raise Exception(f"Token refresh failed: {result}")
     
+    @staticmethod
+    def _remaining_seconds(tokens: Dict[str, Any]) -> Optional[float]:
+        """トークン dict の残り有効秒数を返す。expires_at が無ければ None。"""
+        expires_at = tokens.get("expires_at")
+        if not expires_at:
+            return None
+        expires_datetime = datetime.fromisoformat(expires_at)
+        if expires_datetime.tzinfo is None:
+            expires_datetime = expires_datetime.replace(tzinfo=JST)
+        return (expires_datetime - datetime.now(JST)).total_seconds()
+
+    def expires_in(self) -> Optional[float]:
+        """アクセストークンの残り有効秒数を返す。トークンが無ければ None。
+
+        _set_tokens が前計算した monotonic デッドラインとの差だけで済み、
+        呼びのたびの fromisoformat / datetime.now は発生しない。
+        """
+        if self._expiry_monotonic is None:
+            return None
+        return self._expiry_monotonic - time.monotonic()
+
+    def maybe_prerefresh(self) -> None:
+        """期限が近いトークンをバックグラウンドで先行リフレッシュする。
+
+        実際に切れてから「データ取得」クリック時に同期リフレッシュすると
+        トークンエンドポイント往復ぶんユーザーを待たせる。まだ有効なうちに
+        デーモンスレッドで更新しておく (Google 側の先行リフレッシュと同じ方針)。
+        """
+        if not self.tokens.get("refresh_token"):
+            return
+        remaining = self.expires_in()
+        if remaining is None or remaining <= 0 or remaining >= self.REFRESH_MARGIN_SECONDS:
+            return
+        # 取れなければ既に別スレッドがリフレッシュ中
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+
+        def _worker():
+            try:
+                self.refresh_access_token()
+                self._last_refresh_failed = False
+            except Exception:
+                # 次の get_valid_access_token に同期リフレッシュでやり直させる
+                self._last_refresh_failed = True
+                oauth_cache.invalidate(self._cache_key)
+            finally:
+                self._refresh_lock.release()
+
+        threading.Thread(target=_worker, daemon=True).start()
+
     def get_valid_access_token(self, strict: bool = False, refresh_from_db: bool = True) -> Optional[str]:
         if refresh_from_db:
             self.sync_tokens_from_db()
@@ -135,34 +375,72 @@ class WithingsOAuth:
                 raise OAuthRefreshError("Withings token not found in oauth_tokens")
             return None
         
-        expires_at = self.tokens.get("expires_at")
-        if expires_at:
-            expires_datetime = datetime.fromisoformat(expires_at)
-            # naive な ISO 文字列 (旧トークン) に JST を付与して aware 化
-            if expires_datetime.tzinfo is None:
-                expires_datetime = expires_datetime.replace(tzinfo=JST)
-            if datetime.now(JST) >= expires_datetime - timedelta(minutes=5):
+        # FRESH/STALE/EXPIRED の3状態で扱う:
+        #   FRESH  … そのまま返す
+        #   STALE  … 現トークンを即返しつつ裏でリフレッシュ (呼び出し元を待たせない)
+        #   EXPIRED … 同期リフレッシュ以外に選択肢なし
+        remaining = self.expires_in()
+        if remaining is not None:
+            if remaining <= 0 or self._last_refresh_failed:
                 try:
                     self.refresh_access_token()
+                    self._last_refresh_failed = False
                 except Exception as e:
+                    oauth_cache.invalidate(self._cache_key)
                     if strict:
                         raise OAuthRefreshError(f"Withings token refresh failed: {e}") from e
                     return None
-        
+            elif remaining < self.REFRESH_MARGIN_SECONDS:
+                self.maybe_prerefresh()
+
+
         access_token = self.tokens.get("access_token")
         if strict and not access_token:
             raise OAuthRefreshError("Withings access_token is empty")
         return access_token
     
     def is_authenticated(self) -> bool:
+        # 速路: メモリ上のトークンがまだ余裕を持って有効なら、monotonic の
+        # 引き算 1 回で済ませる。DB 照会やリフレッシュ判定は期限が近いときだけ。
+        if self.tokens.get("access_token"):
+            remaining = self.expires_in()
+            if remaining is not None and remaining > self.REFRESH_MARGIN_SECONDS:
+                return True
         return self.get_valid_access_token(refresh_from_db=True) is not None
-    
+
+    def is_authenticated_cached(self) -> bool:
+        """is_authenticated の結果を短時間キャッシュして返す。
+
+        サイドバーや各ページが rerun のたびに呼ぶが、毎回 DB から
+        トークンを読み直す必要はない。インスタンスは st.cache_resource で
+        プロセス内共有されるため属性キャッシュで足り、トークンの保存・
+        削除時に無効化する。
+        """
+        now = time.monotonic()
+        if self._auth_cache is not None and now - self._auth_cache_ts < self.AUTH_CACHE_TTL_SECONDS:
+            return self._auth_cache
+        ok = self.is_authenticated()
+        self._auth_cache = ok
+        self._auth_cache_ts = now
+        return ok
+
+    def _invalidate_auth_cache(self):
+        self._auth_cache = None
+
     def get_user_id(self) -> Optional[str]:
         return self.tokens.get("user_id")
     
     def clear_tokens(self):
+        # 削除後にデバウンス中の古いトークンが書き戻されないようにする
+        with self._pending_lock:
+            self._pending_tokens = None
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
         try:
             self.db_manager.delete_token(self.user_id, self.PROVIDER)
         except Exception:
             pass
-        self.tokens = {}
+        self._set_tokens({})
+        oauth_cache.invalidate(self._cache_key)
+        self._invalidate_auth_cache()
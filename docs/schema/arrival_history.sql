@@ -0,0 +1,15 @@
+-- 過去 N 日間の (source, JST 日付) の組を DB 側で DISTINCT してから返す RPC。
+-- Python 側で 1 万行を引いて set で潰す代わりに、ソース数 × 日数 (~70行)
+-- だけをワイヤに載せる。
+CREATE OR REPLACE FUNCTION arrival_history(days INT)
+RETURNS TABLE(source TEXT, fetched_date DATE)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT DISTINCT
+        r.source,
+        (r.fetched_at AT TIME ZONE 'Asia/Tokyo')::date AS fetched_date
+    FROM raw_data_lake r
+    WHERE r.fetched_at >= now() - make_interval(days => days + 1)
+    ORDER BY fetched_date, source;
+$$;
@@ -0,0 +1,19 @@
+-- get_data_arrival_counts 用の集約関数。
+-- source × JST 日付ごとの到着件数を DB 側で GROUP BY してから返す。
+-- 全行を転送して Python 側で数えるのに比べ、ワイヤ上のペイロードが
+-- O(行数) から O(source 数 × 日数) に縮む。
+-- Supabase SQL Editor で実行して適用する。
+CREATE OR REPLACE FUNCTION data_arrival_counts(days INT)
+RETURNS TABLE(source TEXT, day DATE, cnt BIGINT)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT
+        r.source,
+        (r.fetched_at AT TIME ZONE 'Asia/Tokyo')::date AS day,
+        count(*) AS cnt
+    FROM raw_data_lake r
+    WHERE r.fetched_at >= now() - make_interval(days => days + 1)
+    GROUP BY 1, 2
+    ORDER BY day, source;
+$$;
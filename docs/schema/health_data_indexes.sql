@@ -0,0 +1,9 @@
+-- get_weight_data / get_oura_data の
+--   WHERE user_id = ? ORDER BY measured_at DESC LIMIT ?
+-- を index scan で返すための複合インデックス。
+-- これが無いと user_id での絞り込み後にソートが入る。
+CREATE INDEX IF NOT EXISTS weight_data_user_measured_idx
+    ON weight_data (user_id, measured_at DESC);
+
+CREATE INDEX IF NOT EXISTS oura_data_user_measured_idx
+    ON oura_data (user_id, measured_at DESC);
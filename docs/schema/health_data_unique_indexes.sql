@@ -0,0 +1,13 @@
+-- insert_weight_data_bulk / insert_oura_data_bulk の
+--   upsert(..., on_conflict="user_id,measured_at")
+-- が参照するユニークインデックス。これが無いと Postgres が 42P10
+-- (no unique or exclusion constraint matching the ON CONFLICT
+-- specification) で upsert を拒否する。
+-- 既存データに (user_id, measured_at) の重複行があると作成に失敗する
+-- ため、その場合は先に重複を整理してから適用する。
+-- Supabase SQL Editor で実行して適用する。
+CREATE UNIQUE INDEX IF NOT EXISTS weight_data_user_measured_key
+    ON weight_data (user_id, measured_at);
+
+CREATE UNIQUE INDEX IF NOT EXISTS oura_data_user_measured_key
+    ON oura_data (user_id, measured_at);
@@ -0,0 +1,23 @@
+-- Oura sleep の「日付ごとの最新スコア」を DB 側で選抜して返す RPC。
+-- Python 側で全行を引いて drop_duplicates する代わりに、
+-- DISTINCT ON で 1 日 1 行に潰してからワイヤに載せる。
+CREATE OR REPLACE FUNCTION oura_sleep_latest_per_day(days INT)
+RETURNS TABLE(day TEXT, score INT)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT DISTINCT ON (d.day) d.day, d.score
+    FROM (
+        SELECT
+            COALESCE(payload->>'day', substring(recorded_at::text, 1, 10)) AS day,
+            (payload->>'score')::int AS score,
+            fetched_at
+        FROM raw_data_lake
+        WHERE source = 'oura'
+          AND category = 'sleep'
+          AND payload ? 'score'
+          AND fetched_at >= now() - make_interval(days => days)
+    ) d
+    WHERE d.score IS NOT NULL
+    ORDER BY d.day, d.fetched_at DESC;
+$$;
@@ -0,0 +1,4 @@
+-- arrival 系クエリ (fetched_at >= 範囲 + source) を index scan にするための複合インデックス。
+-- これが無いと範囲フィルタ + ORDER BY が bitmap heap scan + ソートになる。
+CREATE INDEX IF NOT EXISTS raw_data_lake_fetched_at_source_idx
+    ON raw_data_lake (fetched_at DESC, source);
@@ -0,0 +1,41 @@
+-- raw_data_lake の「重複チェック + INSERT」を 1 往復で行う RPC。
+-- Python 側の SELECT → ハッシュ比較 → INSERT (2 往復) を置き換える。
+-- payload_hash はアプリ側で計算した SHA-256 (変動キー除外済み) を格納する。
+
+ALTER TABLE raw_data_lake ADD COLUMN IF NOT EXISTS payload_hash TEXT;
+
+CREATE INDEX IF NOT EXISTS raw_data_lake_hash_idx
+    ON raw_data_lake (user_id, source, category, payload_hash);
+
+CREATE OR REPLACE FUNCTION save_if_changed(
+    _user_id TEXT,
+    _source TEXT,
+    _category TEXT,
+    _payload JSONB,
+    _payload_hash TEXT,
+    _recorded_at TIMESTAMPTZ
+) RETURNS BOOLEAN
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM raw_data_lake
+        WHERE user_id = _user_id
+          AND source = _source
+          AND category = _category
+          AND payload_hash = _payload_hash
+    ) THEN
+        RETURN FALSE;  -- 同一内容が既にある → スキップ
+    END IF;
+
+    INSERT INTO raw_data_lake
+        (user_id, fetched_at, recorded_at, source, category, payload, payload_hash)
+    VALUES
+        (_user_id, now(), _recorded_at, _source, _category, _payload, _payload_hash);
+    RETURN TRUE;
+END;
+$$;
+
+-- 既存行のバックフィル (アプリ側ハッシュとは一致しないため NULL のままでも可):
+-- UPDATE raw_data_lake SET payload_hash = '' WHERE payload_hash IS NULL;
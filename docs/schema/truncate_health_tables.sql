@@ -0,0 +1,9 @@
+-- 「全データ削除」用の RPC。
+-- PostgREST の DELETE ... WHERE id <> 0 は行単位の削除 + WAL になるため、
+-- カタログ操作で一括破棄できる TRUNCATE をサーバ側関数として公開する。
+CREATE OR REPLACE FUNCTION truncate_health_tables() RETURNS void
+LANGUAGE sql
+SECURITY DEFINER
+AS $$
+    TRUNCATE weight_data, oura_data RESTART IDENTITY;
+$$;
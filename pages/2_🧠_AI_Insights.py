@@ -90,7 +90,8 @@ if st.session_state.deep_insight_date != target_date:
 
 def _run_deep_insight_analysis():
     with st.spinner("Geminiが昨日のデータを読み解いています..."):
-        raw_data = db_manager.get_raw_data_by_date(target_date)
+        # payload をプロンプトで使うフィールドだけに射影して転送量を抑える
+        raw_data = db_manager.get_raw_data_for_prompt(target_date)
         if not raw_data:
             st.warning(f"⚠️ {target_date} の生データがありません。データを更新してください。")
             return
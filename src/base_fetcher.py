@@ -3,6 +3,11 @@ from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta, timezone
 import json
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 _JST = timezone(timedelta(hours=9))
 
 
@@ -23,8 +28,34 @@ class BaseFetcher(ABC):
         return []
     
     def save_raw_data(self, data: Any) -> str:
+        # orjson は UTF-8 をそのまま出力する C 実装で、大きな raw payload の
+        # シリアライズ CPU を大きく削れる。未導入環境では stdlib にフォールバック。
+        if orjson is not None:
+            return orjson.dumps(data, default=str).decode()
         return json.dumps(data, ensure_ascii=False, default=str)
     
+    def save_raw_data_parquet(self, records: List[Dict[str, Any]], path: str) -> None:
+        """レコードのリストを Parquet (ZSTD 圧縮) で書き出す。
+
+        JSON 文字列化はフィールドごとに Python スカラーを処理するが、
+        Arrow の列指向エンコードは C++ 側で圧縮・書き込みまで完結し、
+        同じスキーマが繰り返される日次インジェストに向く。
+
+        pyarrow はオプション依存 (requirements.txt には含めない)。
+        この API を使う場合のみ `pip install pyarrow` で導入する。
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise RuntimeError(
+                "pyarrow is not installed. Parquet export is optional — "
+                "install it with `pip install pyarrow` to use save_raw_data_parquet."
+            ) from e
+
+        table = pa.Table.from_pylist(records)
+        pq.write_table(table, path, compression="zstd", use_dictionary=True)
+
     def get_last_fetch_time(self) -> Optional[datetime]:
         return self.last_fetch_time
     
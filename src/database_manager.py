@@ -1,40 +1,120 @@
+import functools
 import hashlib
 import json
 import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Optional, Dict, Any, List
 from supabase import create_client, Client
 from src.utils.secrets_loader import load_secrets
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # JST (UTC+9) タイムゾーン
 JST = timezone(timedelta(hours=9))
+_JST_OFFSET = timedelta(hours=9)
+_ZERO_OFFSET = timedelta(0)
 
 logger = logging.getLogger(__name__)
 
 
+@functools.lru_cache(maxsize=4)
+def _get_cached_client(url: str, key: str) -> Client:
+    """Supabase Client を (url, key) ごとに 1 つだけ生成して共有する。
+
+    create_client は httpx セッション (接続プール込み) を組み立てるため、
+    DatabaseManager を作り直すたびに呼ぶと TCP/TLS を張り直すことになる。
+    keepalive 付きの接続プールと transport レベルのリトライを明示的に
+    設定した httpx.Client を渡し、並行アクセス時の接続枯渇を防ぐ。
+    """
+    try:
+        import httpx
+        from supabase.lib.client_options import SyncClientOptions
+
+        http_client = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=60,
+                max_keepalive_connections=40,
+                keepalive_expiry=60,
+            ),
+            transport=httpx.HTTPTransport(retries=3),
+        )
+        return create_client(url, key, options=SyncClientOptions(httpx_client=http_client))
+    except Exception as e:
+        # 古い supabase-py では httpx_client オプションが無い
+        logger.info(f"custom httpx client unavailable, using defaults: {e}")
+        return create_client(url, key)
+
+
+def force_reconnect() -> None:
+    """共有クライアントを破棄し、次回アクセス時に接続を張り直す"""
+    _get_cached_client.cache_clear()
+
+
 def _now_jst() -> datetime:
     """現在の日本時間 (aware datetime) を返す"""
     return datetime.now(JST)
 
 
+@functools.lru_cache(maxsize=4096)
 def _to_jst(iso_str: str) -> datetime:
-    """ISO 文字列 (UTC / aware) を JST の aware datetime に変換する"""
+    """ISO 文字列 (UTC / aware) を JST の aware datetime に変換する。
+
+    arrival 系の集約は数千行が同じ fetched_at を共有するため、
+    lru_cache で fromisoformat + tz 変換の再実行を省く。
+    JST は固定オフセットなので、UTC (Supabase の TIMESTAMPTZ は常に +00:00)
+    と naive 入力は astimezone の tz 機構を通さず +9h の加算で変換する。
+    """
     dt = datetime.fromisoformat(iso_str)
-    if dt.tzinfo is None:
-        dt = dt.replace(tzinfo=timezone.utc)
+    offset = dt.utcoffset()
+    if offset is None:
+        return (dt + _JST_OFFSET).replace(tzinfo=JST)
+    if offset == _ZERO_OFFSET:
+        return (dt.replace(tzinfo=None) + _JST_OFFSET).replace(tzinfo=JST)
     return dt.astimezone(JST)
 
 
+@functools.lru_cache(maxsize=4096)
 def _to_jst_date(iso_str: str) -> str:
     """ISO 文字列から JST の日付文字列 (YYYY-MM-DD) を返す"""
     return _to_jst(iso_str).strftime("%Y-%m-%d")
 
 
+@functools.lru_cache(maxsize=4096)
 def _to_jst_hour(iso_str: str) -> int:
     """ISO 文字列から JST の時 (0-23) を返す"""
     return _to_jst(iso_str).hour
 
 
+# recorded_at の導出に使うタイムスタンプ候補キー
+_EPOCH_KEYS = ("dt", "timestamp", "ts", "t", "time")
+_ISO_KEYS = ("recorded_at", "date", "day")
+_TS_KEYS = frozenset(_EPOCH_KEYS) | frozenset(_ISO_KEYS)
+
+
+# _parse_raw_data のキャッシュに載せる文字列長の上限 (メモリを抑える)
+_PARSE_CACHE_MAX_LEN = 64_000
+
+
+@functools.lru_cache(maxsize=1024)
+def _cached_loads(raw: str) -> Any:
+    """同一 JSON 文字列の再パースを省く。返り値は共有されるため読み取り専用。"""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+@functools.lru_cache(maxsize=1024)
+def _epoch_to_jst_iso(val: float) -> str:
+    """Unix epoch を JST の ISO 文字列に変換する (分単位で繰り返す値が多い)"""
+    return datetime.fromtimestamp(val, tz=JST).isoformat()
+
+
 def _extract_switchbot_value(payload: Dict[str, Any], key: str) -> Optional[Any]:
     """Extract value from SwitchBot payload, handling both flat and nested formats.
     
@@ -66,11 +146,27 @@ def _extract_switchbot_value(payload: Dict[str, Any], key: str) -> Optional[Any]
 
 
 class DatabaseManager:
+    # インスタンスごとの __dict__ を持たせず属性アクセスを固定スロットにする
+    __slots__ = ("secrets", "supabase", "env", "db_config",
+                 "_latest_hash", "_hash_cache_ttl")
+
+    # 1 回の upsert に載せる最大行数 (PostgREST のリクエストサイズ上限を
+    # 超えない安全値)
+    BULK_UPSERT_BATCH = 500
+
     def __init__(self, secrets_path: str = "config/secrets.yaml"):
         self.secrets = load_secrets(secrets_path)
         self.supabase: Client = self._create_client()
         self.env = "cloud"
         self.db_config = {"type": "supabase"}
+        # (user_id, source, category) → (最新 payload ハッシュ, monotonic 期限)。
+        # 直前の保存と同内容なら往復ゼロでスキップできる。
+        # DM_HASH_CACHE_TTL=0 でプロファイリング時に無効化できる。
+        self._latest_hash: Dict[tuple, tuple] = {}
+        try:
+            self._hash_cache_ttl = float(os.environ.get("DM_HASH_CACHE_TTL", "3600"))
+        except ValueError:
+            self._hash_cache_ttl = 3600.0
     
     def _create_client(self) -> Client:
         supabase_config = self.secrets.get("supabase", {})
@@ -78,7 +174,7 @@ class DatabaseManager:
         key = supabase_config.get("key", "")
         if not url or not key:
             raise ValueError("Supabase URL and Key must be set in config/secrets.yaml")
-        return create_client(url, key)
+        return _get_cached_client(url, key)
     
     def connect(self):
         pass
@@ -105,14 +201,120 @@ class DatabaseManager:
             "raw_data": self._parse_raw_data(raw_data),
         }
         self.supabase.table("weight_data").insert(data).execute()
-    
-    def get_weight_data(self, user_id: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
-        query = self.supabase.table("weight_data").select("*").order("measured_at", desc=True).limit(limit)
+
+    @staticmethod
+    def _norm_measured_at(value: Any) -> str:
+        """measured_at を比較用に正規化する ("2026-08-27 00:00:00" と
+        "2026-08-27T00:00:00" の表記ゆれを吸収)"""
+        return str(value).replace(" ", "T")[:19]
+
+    def _bulk_upsert_health(self, table: str, payload: List[Dict[str, Any]]) -> int:
+        """(user_id, measured_at) をキーに upsert し、書き込んだ件数を返す。
+
+        ユニークインデックス (docs/schema/health_data_unique_indexes.sql)
+        が無い環境では upsert が 42P10 で拒否されるため、従来どおり
+        既存キーの SELECT + 差分 insert にフォールバックする。
+        """
+        try:
+            for start in range(0, len(payload), self.BULK_UPSERT_BATCH):
+                self.supabase.table(table).upsert(
+                    payload[start:start + self.BULK_UPSERT_BATCH],
+                    on_conflict="user_id,measured_at",
+                ).execute()
+            return len(payload)
+        except Exception as e:
+            logger.info(f"bulk upsert on {table} unavailable, falling back to insert with dedup: {e}")
+
+        # 既存の (user_id, measured_at) をバッチの期間に絞って 1 クエリで取得
+        users = sorted({row["user_id"] for row in payload})
+        stamps = sorted(self._norm_measured_at(row["measured_at"]) for row in payload)
+        existing = (
+            self.supabase.table(table)
+            .select("user_id, measured_at")
+            .in_("user_id", users)
+            .gte("measured_at", stamps[0])
+            .lte("measured_at", stamps[-1])
+            .execute()
+        )
+        known = {
+            (row["user_id"], self._norm_measured_at(row["measured_at"]))
+            for row in existing.data or []
+        }
+        fresh = []
+        for row in payload:
+            key = (row["user_id"], self._norm_measured_at(row["measured_at"]))
+            if key in known:
+                continue
+            known.add(key)
+            fresh.append(row)
+        for start in range(0, len(fresh), self.BULK_UPSERT_BATCH):
+            self.supabase.table(table).insert(fresh[start:start + self.BULK_UPSERT_BATCH]).execute()
+        return len(fresh)
+
+    def insert_weight_data_bulk(self, records: List[Dict[str, Any]]) -> int:
+        """体重データをまとめて upsert する。
+
+        1 件ずつ insert すると PostgREST への往復がレコード数ぶん発生するため、
+        (user_id, measured_at) をコンフリクトキーにして 1 リクエストに束ねる。
+        ユニークインデックス未適用の環境では差分 insert にフォールバック。
+        """
+        if not records:
+            return 0
+        payload = [
+            {
+                "user_id": r["user_id"],
+                "measured_at": r["measured_at"],
+                "weight_kg": r["weight_kg"],
+                "raw_data": self._parse_raw_data(r["raw_data"]),
+            }
+            for r in records
+        ]
+        return self._bulk_upsert_health("weight_data", payload)
+
+    def get_weight_data(self, user_id: Optional[str] = None, limit: int = 100,
+                        columns: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        # columns 指定時はサーバ側で射影し、raw_data のような重い列を転送しない
+        select = ", ".join(columns) if columns else "*"
+        query = self.supabase.table("weight_data").select(select).order("measured_at", desc=True).limit(limit)
         if user_id:
             query = query.eq("user_id", user_id)
         response = query.execute()
         return response.data
 
+    def get_weight_columns(self, user_id: Optional[str] = None, limit: int = 100) -> Dict[str, Any]:
+        """体重データを列指向 (SoA) の NumPy 配列で返す。
+
+        平均・トレンドなどの集計を Python の per-row dict 参照ではなく
+        C レベルのベクトル演算に落とすための形式。
+        Returns:
+            {"measured_at": np.ndarray[str], "weight_kg": np.ndarray[float64]}
+        """
+        import numpy as np
+
+        query = (
+            self.supabase.table("weight_data")
+            .select("measured_at, weight_kg")
+            .order("measured_at", desc=True)
+            .limit(limit)
+        )
+        if user_id:
+            query = query.eq("user_id", user_id)
+        rows = query.execute().data or []
+
+        measured_at: List[str] = []
+        weight_kg: List[float] = []
+        for row in rows:
+            value = row.get("weight_kg")
+            if value is None:
+                continue
+            measured_at.append(str(row.get("measured_at") or ""))
+            weight_kg.append(float(value))
+
+        return {
+            "measured_at": np.array(measured_at),
+            "weight_kg": np.array(weight_kg, dtype=np.float64),
+        }
+
     def get_latest_weight_measured_at(self, user_id: str = "user_001") -> Optional[str]:
         response = (
             self.supabase.table("weight_data")
@@ -166,14 +368,66 @@ class DatabaseManager:
             "raw_data": self._parse_raw_data(raw_data),
         }
         self.supabase.table("oura_data").insert(data).execute()
-    
-    def get_oura_data(self, user_id: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
-        query = self.supabase.table("oura_data").select("*").order("measured_at", desc=True).limit(limit)
+
+    def insert_oura_data_bulk(self, records: List[Dict[str, Any]]) -> int:
+        """Oura データをまとめて upsert する (insert_weight_data_bulk と同様)。
+
+        ユニークインデックス未適用の環境では差分 insert にフォールバック。
+        """
+        if not records:
+            return 0
+        payload = [
+            {
+                "user_id": r["user_id"],
+                "measured_at": r["measured_at"],
+                "activity_score": r.get("activity_score"),
+                "sleep_score": r.get("sleep_score"),
+                "readiness_score": r.get("readiness_score"),
+                "steps": r.get("steps"),
+                "total_sleep_duration": r.get("total_sleep_duration"),
+                "raw_data": self._parse_raw_data(r["raw_data"]),
+            }
+            for r in records
+        ]
+        return self._bulk_upsert_health("oura_data", payload)
+
+    def get_oura_data(self, user_id: Optional[str] = None, limit: int = 100,
+                      columns: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        select = ", ".join(columns) if columns else "*"
+        query = self.supabase.table("oura_data").select(select).order("measured_at", desc=True).limit(limit)
         if user_id:
             query = query.eq("user_id", user_id)
         response = query.execute()
         return response.data
 
+    def truncate_health_tables(self) -> None:
+        """weight_data / oura_data を全削除する。
+
+        docs/schema/truncate_health_tables.sql の RPC を呼び、TRUNCATE による
+        O(1) のカタログ操作で一括破棄する。関数未登録の環境では従来どおり
+        テーブルごとの DELETE にフォールバックする。
+        """
+        try:
+            self.supabase.rpc("truncate_health_tables").execute()
+            return
+        except Exception as e:
+            logger.warning(f"truncate_health_tables RPC failed, falling back to DELETE: {e}")
+        for table in ("weight_data", "oura_data"):
+            self.supabase.table(table).delete().neq("id", 0).execute()
+
+    def get_raw_data_by_id(self, table: str, record_id: int) -> Optional[Any]:
+        """指定行の raw_data だけを点取得する (一覧表示から JSON blob を外すため)。"""
+        response = (
+            self.supabase.table(table)
+            .select("raw_data")
+            .eq("id", record_id)
+            .limit(1)
+            .execute()
+        )
+        if not response.data:
+            return None
+        return response.data[0].get("raw_data")
+
     def get_latest_oura_measured_at(self, user_id: str = "user_001") -> Optional[str]:
         response = (
             self.supabase.table("oura_data")
@@ -232,9 +486,11 @@ class DatabaseManager:
         self.supabase.table("environmental_logs").insert(data).execute()
     
     def get_latest_environmental_log(self) -> Optional[Dict[str, Any]]:
+        # 表示に使う列だけ射影する。raw_data (API 応答の丸ごと JSON) は
+        # 行あたり数 KB あり、SELECT * だと毎回それを転送してしまう。
         response = (
             self.supabase.table("environmental_logs")
-            .select("*")
+            .select("timestamp, source, weather_summary, temp, humidity, pressure")
             .order("timestamp", desc=True)
             .limit(1)
             .execute()
@@ -396,21 +652,54 @@ class DatabaseManager:
 
         return totals
 
+    # arrival 系クエリの 1 ページあたりの行数
+    RAW_PAGE_SIZE = 1000
+
+    def _fetch_raw_rows_paged(self, columns: str, start_date: str) -> List[Dict[str, Any]]:
+        """fetched_at >= start_date の行をページ送りで全件取得する。
+
+        固定の .limit(N) は取り込みが増えると黙って切り捨てる。range による
+        ページングなら上限なしで、raw_data_lake_fetched_at_source_idx
+        (docs/schema/raw_data_lake_indexes.sql) と組み合わせて index scan で返る。
+        """
+        rows: List[Dict[str, Any]] = []
+        offset = 0
+        while True:
+            page = (
+                self.supabase.table("raw_data_lake")
+                .select(columns)
+                .gte("fetched_at", start_date)
+                .order("fetched_at")
+                .range(offset, offset + self.RAW_PAGE_SIZE - 1)
+                .execute()
+            ).data
+            rows.extend(page)
+            if len(page) < self.RAW_PAGE_SIZE:
+                return rows
+            offset += self.RAW_PAGE_SIZE
+
     def get_data_arrival_history(self, days: int = 14) -> List[Dict[str, Any]]:
-        """過去N日間の (source, fetched_date) リストを raw_data_lake から取得"""
+        """過去N日間の (source, fetched_date) リストを raw_data_lake から取得。
+
+        DISTINCT と JST 日付変換を DB 側で行う arrival_history RPC
+        (docs/schema/arrival_history.sql) を優先し、無い環境では従来の
+        全行取得 + Python 側 dedup にフォールバックする。
+        """
+        try:
+            response = self.supabase.rpc("arrival_history", {"days": days}).execute()
+            return [
+                {"source": row["source"], "fetched_date": str(row["fetched_date"])}
+                for row in response.data
+            ]
+        except Exception as e:
+            logger.info(f"arrival_history RPC unavailable, falling back: {e}")
+
         start_date = (_now_jst() - timedelta(days=days + 1)).isoformat()
-        response = (
-            self.supabase.table("raw_data_lake")
-            .select("source, fetched_at")
-            .gte("fetched_at", start_date)
-            .order("fetched_at")
-            .limit(50000)
-            .execute()
-        )
+        data = self._fetch_raw_rows_paged("source, fetched_at", start_date)
         # fetched_at (TIMESTAMPTZ / UTC) を JST 日付に変換して返す
         results = []
         seen = set()
-        for row in response.data:
+        for row in data:
             fetched_date = _to_jst_date(row["fetched_at"])
             key = (row["source"], fetched_date)
             if key not in seen:
@@ -418,6 +707,33 @@ class DatabaseManager:
                 results.append({"source": row["source"], "fetched_date": fetched_date})
         return results
 
+    def get_data_arrival_counts(self, days: int = 14) -> List[Dict[str, Any]]:
+        """過去N日間の source×JST日付 ごとの到着件数を取得。
+
+        GROUP BY を DB 側で行う data_arrival_counts RPC
+        (docs/schema/data_arrival_counts.sql) を優先し、無い環境では
+        全行取得 + Python 側カウントにフォールバックする。
+        """
+        try:
+            response = self.supabase.rpc("data_arrival_counts", {"days": days}).execute()
+            return [
+                {"source": row["source"], "fetched_date": str(row["day"]), "count": int(row["cnt"])}
+                for row in response.data
+            ]
+        except Exception as e:
+            logger.info(f"data_arrival_counts RPC unavailable, falling back: {e}")
+
+        start_date = (_now_jst() - timedelta(days=days + 1)).isoformat()
+        data = self._fetch_raw_rows_paged("source, fetched_at", start_date)
+        counts: Dict[tuple, int] = {}
+        for row in data:
+            key = (row["source"], _to_jst_date(row["fetched_at"]))
+            counts[key] = counts.get(key, 0) + 1
+        return [
+            {"source": source, "fetched_date": fetched_date, "count": count}
+            for (source, fetched_date), count in sorted(counts.items(), key=lambda kv: (kv[0][1], kv[0][0]))
+        ]
+
     def get_data_arrival_rich(self, days: int = 14) -> Dict[str, Dict[str, Any]]:
         """過去N日間の source×date ごとにサマリー統計と時系列サンプルを返す。
 
@@ -436,18 +752,11 @@ class DatabaseManager:
             }
         """
         start_date = (_now_jst() - timedelta(days=days + 1)).isoformat()
-        response = (
-            self.supabase.table("raw_data_lake")
-            .select("source, category, fetched_at, payload")
-            .gte("fetched_at", start_date)
-            .order("fetched_at")
-            .limit(50000)
-            .execute()
-        )
+        data = self._fetch_raw_rows_paged("source, category, fetched_at, payload", start_date)
 
         # source×date ごとにレコードを集約 (fetched_at を JST 日付に変換)
         buckets: Dict[tuple, list] = {}
-        for row in response.data:
+        for row in data:
             fetched_date = _to_jst_date(row["fetched_at"])
             key = (row["source"], fetched_date)
             buckets.setdefault(key, []).append(row)
@@ -457,14 +766,9 @@ class DatabaseManager:
             source = key[0]
             entry: Dict[str, Any] = {"has_data": True}
 
-            if source in ("switchbot", "weather"):
-                entry.update(self._build_timeseries(source, rows))
-            elif source == "oura":
-                entry["badge"] = self._build_oura_badge(rows)
-            elif source == "withings":
-                entry["badge"] = self._build_withings_badge(rows)
-            elif source == "google_fit":
-                entry["badge"] = self._build_google_fit_badge(rows)
+            builder = self._RICH_BUILDERS.get(source)
+            if builder:
+                entry.update(builder(self, source, rows))
 
             result[key] = entry
         return result
@@ -495,34 +799,47 @@ class DatabaseManager:
                     "pressure": main.get("pressure"),
                 })
 
-        # サマリー統計
+        # サマリー統計: フィールドごとに再走査せず、1 パスで sum/min/max を集計
+        acc = {f: [0.0, float("inf"), float("-inf"), 0] for f in ("temp", "humidity", "co2", "pressure")}
+        for point in timeseries:
+            for field, a in acc.items():
+                v = point.get(field)
+                if v is None:
+                    continue
+                a[0] += v
+                if v < a[1]:
+                    a[1] = v
+                if v > a[2]:
+                    a[2] = v
+                a[3] += 1
+
         summary = {}
-        for field in ("temp", "humidity", "co2", "pressure"):
-            vals = [p[field] for p in timeseries if p.get(field) is not None]
-            if vals:
-                summary[f"{field}_avg"] = round(sum(vals) / len(vals), 1)
-                summary[f"{field}_min"] = round(min(vals), 1)
-                summary[f"{field}_max"] = round(max(vals), 1)
+        for field, (total, vmin, vmax, n) in acc.items():
+            if n:
+                summary[f"{field}_avg"] = round(total / n, 1)
+                summary[f"{field}_min"] = round(vmin, 1)
+                summary[f"{field}_max"] = round(vmax, 1)
 
         return {"timeseries": timeseries, "summary": summary}
 
-    @staticmethod
-    def _build_oura_badge(rows: list) -> Dict[str, Any]:
+    # category → バッジキーの対応 (行ごとの if/elif チェーンを 1 回の dict 引きに)
+    _OURA_SCORE_KEYS = {
+        "sleep": "sleep_score",
+        "activity": "activity_score",
+        "readiness": "readiness_score",
+    }
+
+    @classmethod
+    def _build_oura_badge(cls, rows: list) -> Dict[str, Any]:
         """Oura の代表スコアを抽出"""
         badge: Dict[str, Any] = {}
         for row in rows:
             payload = row.get("payload", {})
-            cat = row.get("category", "")
             if not isinstance(payload, dict):
                 continue
-            if cat == "sleep" and "score" in payload:
-                badge["sleep_score"] = payload["score"]
-            elif cat == "activity" and "score" in payload:
-                badge["activity_score"] = payload["score"]
-            elif cat == "readiness" and "score" in payload:
-                badge["readiness_score"] = payload["score"]
-            if "contributors" in payload and "steps" in payload.get("contributors", {}):
-                pass
+            out_key = cls._OURA_SCORE_KEYS.get(row.get("category", ""))
+            if out_key and "score" in payload:
+                badge[out_key] = payload["score"]
             if "steps" in payload:
                 badge["steps"] = payload["steps"]
         return badge
@@ -548,23 +865,40 @@ class DatabaseManager:
             return {"weight_kg": round(weights[-1], 1)}
         return {}
 
-    @staticmethod
-    def _build_google_fit_badge(rows: list) -> Dict[str, Any]:
+    # data_type の部分文字列 → (バッジキー, 変換関数)
+    _GFIT_BADGE_KEYS = (
+        ("step", "steps", int),
+        ("weight", "weight_kg", lambda v: round(float(v), 1)),
+        ("sleep", "sleep_min", int),
+    )
+
+    @classmethod
+    def _build_google_fit_badge(cls, rows: list) -> Dict[str, Any]:
         """Google Fit の歩数・体重を抽出"""
         badge: Dict[str, Any] = {}
         for row in rows:
             payload = row.get("payload", {})
             if not isinstance(payload, dict):
                 continue
-            dt = payload.get("data_type", row.get("category", ""))
+            dt = payload.get("data_type", row.get("category", "")).lower()
             val = payload.get("value")
-            if "step" in dt.lower() and val is not None:
-                badge["steps"] = int(val)
-            elif "weight" in dt.lower() and val is not None:
-                badge["weight_kg"] = round(float(val), 1)
-            elif "sleep" in dt.lower() and val is not None:
-                badge["sleep_min"] = int(val)
+            if val is None:
+                continue
+            for substring, out_key, convert in cls._GFIT_BADGE_KEYS:
+                if substring in dt:
+                    badge[out_key] = convert(val)
+                    break
         return badge
+
+    # source → entry に merge する dict を返すビルダー
+    # (get_data_arrival_rich の if/elif チェーンを 1 回の dict 引きに)
+    _RICH_BUILDERS = {
+        "switchbot": lambda self, source, rows: self._build_timeseries(source, rows),
+        "weather": lambda self, source, rows: self._build_timeseries(source, rows),
+        "oura": lambda self, source, rows: {"badge": self._build_oura_badge(rows)},
+        "withings": lambda self, source, rows: {"badge": self._build_withings_badge(rows)},
+        "google_fit": lambda self, source, rows: {"badge": self._build_google_fit_badge(rows)},
+    }
     
     def get_raw_data_recent(self, limit: int = 100) -> List[Dict[str, Any]]:
         """raw_data_lake の最新 N 件を返す"""
@@ -577,13 +911,23 @@ class DatabaseManager:
         )
         return response.data
 
-    def get_raw_data_by_date(self, target_date: str, user_id: str = "user_001") -> Dict[str, List[Dict[str, Any]]]:
-        """指定日の最新 fetched_at のデータを source ごとに整理して返す"""
+    def get_raw_data_by_date(self, target_date: str, user_id: str = "user_001",
+                             fields: Optional[List[str]] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """指定日の最新 fetched_at のデータを source ごとに整理して返す。
+
+        Args:
+            fields: 取得する列のリスト。None なら従来どおり全列。
+                    payload が不要な集計用途なら
+                    ["source", "category", "fetched_at"] のような射影で
+                    転送量を payload 列ぶん丸ごと削れる。payload の
+                    フィールド単位の射影が必要なら get_raw_data_for_prompt
+                    を使う。
+        """
         start = f"{target_date}T00:00:00"
         end = f"{target_date}T23:59:59"
         response = (
             self.supabase.table("raw_data_lake")
-            .select("*")
+            .select(", ".join(fields) if fields else "*")
             .eq("user_id", user_id)
             .gte("fetched_at", start)
             .lte("fetched_at", end)
@@ -596,6 +940,62 @@ class DatabaseManager:
             result.setdefault(source, []).append(row)
         return result
 
+    # Gemini プロンプトが実際に参照する payload フィールド (source ごと)
+    _PROMPT_PAYLOAD_FIELDS = {
+        "oura": ("day", "score", "steps", "contributors", "total_sleep_duration"),
+        "withings": ("date", "weight", "measures"),
+        "weather": ("main", "weather", "wind"),
+        "switchbot": ("CO2", "temperature", "humidity", "body"),
+        "google_fit": ("data_type", "value", "date"),
+    }
+
+    def get_raw_data_for_prompt(self, target_date: str, user_id: str = "user_001") -> Dict[str, List[Dict[str, Any]]]:
+        """指定日の生データをプロンプトで使うフィールドだけに射影して返す。
+
+        get_raw_data_by_date の SELECT * は payload 列を丸ごと (行あたり
+        数十 KB になり得る) 転送するが、deep_analyze が読むのは一部の
+        フィールドのみ。payload->key のサーバ側射影で必要分だけを引き、
+        source ごとの 5 クエリは並行に投げる。射影が使えない環境では
+        従来の全列取得にフォールバックする。
+        """
+        start = f"{target_date}T00:00:00"
+        end = f"{target_date}T23:59:59"
+
+        def _fetch(source: str, fields: tuple) -> List[Dict[str, Any]]:
+            select = ", ".join(f"payload->{f}" for f in fields)
+            rows = (
+                self.supabase.table("raw_data_lake")
+                .select(select)
+                .eq("user_id", user_id)
+                .eq("source", source)
+                .gte("fetched_at", start)
+                .lte("fetched_at", end)
+                .order("fetched_at", desc=True)
+                .execute()
+            ).data
+            payload_rows = []
+            for row in rows:
+                payload = {f: row[f] for f in fields if row.get(f) is not None}
+                if payload:
+                    payload_rows.append({"source": source, "payload": payload})
+            return payload_rows
+
+        try:
+            result: Dict[str, List[Dict[str, Any]]] = {}
+            with ThreadPoolExecutor(max_workers=len(self._PROMPT_PAYLOAD_FIELDS)) as pool:
+                futures = {
+                    source: pool.submit(_fetch, source, fields)
+                    for source, fields in self._PROMPT_PAYLOAD_FIELDS.items()
+                }
+                for source, future in futures.items():
+                    payload_rows = future.result()
+                    if payload_rows:
+                        result[source] = payload_rows
+            return result
+        except Exception as e:
+            logger.info(f"projected prompt fetch failed, falling back to full rows: {e}")
+            return self.get_raw_data_by_date(target_date, user_id)
+
     def save_daily_insight(self, target_date: str, content: str, model_name: str,
                            user_id: Optional[str] = "user_001"):
         """daily_insights に分析結果を履歴として INSERT 保存する（上書きしない）。"""
@@ -669,62 +1069,87 @@ class DatabaseManager:
         start_date = (_now_jst() - timedelta(days=days)).isoformat()
 
         # ── Oura sleep データ ──
-        oura_resp = (
-            self.supabase.table("raw_data_lake")
-            .select("payload, recorded_at")
-            .eq("source", "oura")
-            .eq("category", "sleep")
-            .gte("fetched_at", start_date)
-            .order("fetched_at")
-            .execute()
-        )
-        sleep_rows: List[Dict[str, Any]] = []
-        for row in oura_resp.data:
-            payload = row.get("payload", {})
-            if not isinstance(payload, dict):
-                continue
-            score = payload.get("score")
-            if score is None:
-                continue
-            # 日付: payload.day → recorded_at[:10]
-            date_str = payload.get("day") or row.get("recorded_at", "")[:10]
-            if len(date_str) < 10:
-                continue
-            sleep_rows.append({"date": date_str[:10], "sleep_score": int(score)})
+        # 「日付ごとの最新スコア」の選抜は oura_sleep_latest_per_day RPC
+        # (docs/schema/oura_sleep_latest_per_day.sql) に寄せ、無い環境では
+        # 従来の全行取得 + drop_duplicates にフォールバックする
+        def _fetch_sleep_rows():
+            sleep_rows: List[Dict[str, Any]] = []
+            try:
+                resp = self.supabase.rpc("oura_sleep_latest_per_day", {"days": days}).execute()
+                sleep_rows = [
+                    {"date": str(row["day"])[:10], "sleep_score": int(row["score"])}
+                    for row in resp.data
+                    if row.get("day") and row.get("score") is not None
+                ]
+                return sleep_rows, True
+            except Exception as e:
+                logger.info(f"oura_sleep_latest_per_day RPC unavailable, falling back: {e}")
+            oura_resp = (
+                self.supabase.table("raw_data_lake")
+                .select("payload, recorded_at")
+                .eq("source", "oura")
+                .eq("category", "sleep")
+                .gte("fetched_at", start_date)
+                .order("fetched_at")
+                .execute()
+            )
+            for row in oura_resp.data:
+                payload = row.get("payload", {})
+                if not isinstance(payload, dict):
+                    continue
+                score = payload.get("score")
+                if score is None:
+                    continue
+                # 日付: payload.day → recorded_at[:10]
+                date_str = payload.get("day") or row.get("recorded_at", "")[:10]
+                if len(date_str) < 10:
+                    continue
+                sleep_rows.append({"date": date_str[:10], "sleep_score": int(score)})
+            return sleep_rows, False
+
+        def _fetch_env_data():
+            return (
+                self.supabase.table("raw_data_lake")
+                .select("payload, fetched_at")
+                .eq("source", "switchbot")
+                .eq("category", "environment")
+                .gte("fetched_at", start_date)
+                .order("fetched_at")
+                .execute()
+            ).data
+
+        # Oura と SwitchBot のクエリは独立なので並行に投げ、往復レイテンシを重ねる
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            sleep_future = pool.submit(_fetch_sleep_rows)
+            env_future = pool.submit(_fetch_env_data)
+            sleep_rows, deduped = sleep_future.result()
+            env_data = env_future.result()
 
         if not sleep_rows:
             return pd.DataFrame(columns=["date", "sleep_score", "co2_avg", "temp_avg", "humidity_avg"])
 
         df_sleep = pd.DataFrame(sleep_rows)
-        # 同日に複数レコードがある場合は最新 (最後) を採用
-        df_sleep = df_sleep.drop_duplicates(subset="date", keep="last")
+        if not deduped:
+            # 同日に複数レコードがある場合は最新 (最後) を採用
+            df_sleep = df_sleep.drop_duplicates(subset="date", keep="last")
 
         # ── SwitchBot environment データ ──
-        sb_resp = (
-            self.supabase.table("raw_data_lake")
-            .select("payload, fetched_at")
-            .eq("source", "switchbot")
-            .eq("category", "environment")
-            .gte("fetched_at", start_date)
-            .order("fetched_at")
-            .execute()
-        )
-        env_rows: List[Dict[str, Any]] = []
-        for row in sb_resp.data:
+        # 行ごとの dict 生成と _to_jst_date 呼び出しを避け、並列リスト +
+        # ベクトル化した tz 変換で日付を付ける (数千行で効く)
+        ts: List[str] = []
+        co2: List[Any] = []
+        temp: List[Any] = []
+        humidity: List[Any] = []
+        for row in env_data:
             payload = row.get("payload", {})
             if not isinstance(payload, dict):
                 continue
-            date_str = _to_jst_date(row.get("fetched_at", "1970-01-01T00:00:00+00:00"))
-            if len(date_str) < 10:
-                continue
-            env_rows.append({
-                "date": date_str,
-                "co2": _extract_switchbot_value(payload, "CO2"),
-                "temp": _extract_switchbot_value(payload, "temperature"),
-                "humidity": _extract_switchbot_value(payload, "humidity"),
-            })
-
-        if not env_rows:
+            ts.append(row.get("fetched_at", "1970-01-01T00:00:00+00:00"))
+            co2.append(_extract_switchbot_value(payload, "CO2"))
+            temp.append(_extract_switchbot_value(payload, "temperature"))
+            humidity.append(_extract_switchbot_value(payload, "humidity"))
+
+        if not ts:
             # SwitchBot データなし → sleep のみ返す
             df_sleep = df_sleep.rename(columns={"sleep_score": "sleep_score"})
             df_sleep["co2_avg"] = None
@@ -733,9 +1158,14 @@ class DatabaseManager:
             df_sleep = df_sleep.sort_values("date").reset_index(drop=True)
             return df_sleep
 
-        df_env = pd.DataFrame(env_rows)
+        df_env = pd.DataFrame({"ts": ts, "co2": co2, "temp": temp, "humidity": humidity})
+        df_env["date"] = (
+            pd.to_datetime(df_env["ts"], format="ISO8601", utc=True, errors="coerce")
+            .dt.tz_convert("Asia/Tokyo")
+            .dt.strftime("%Y-%m-%d")
+        )
         # 日付ごとに平均を算出
-        df_env_agg = df_env.groupby("date").agg(
+        df_env_agg = df_env.groupby("date", sort=False).agg(
             co2_avg=("co2", "mean"),
             temp_avg=("temp", "mean"),
             humidity_avg=("humidity", "mean"),
@@ -758,6 +1188,12 @@ class DatabaseManager:
     def _strip_volatile(cls, obj: Any) -> Any:
         """payload から変動するメタデータキーを再帰的に除外したコピーを返す"""
         if isinstance(obj, dict):
+            # 変動キーを含まずネストも無い dict (非 weather 系の典型) は
+            # コピーせずそのまま返す
+            if cls._VOLATILE_KEYS.isdisjoint(obj) and not any(
+                isinstance(v, (dict, list)) for v in obj.values()
+            ):
+                return obj
             return {
                 k: cls._strip_volatile(v)
                 for k, v in obj.items()
@@ -767,13 +1203,88 @@ class DatabaseManager:
             return [cls._strip_volatile(item) for item in obj]
         return obj
 
+    # 正規化 JSON のエンコーダ (毎回 json.dumps がオプション解決するのを避ける)。
+    # separators は orjson と同じコンパクト形式に揃える — payload_hash は
+    # DB に永続化されるため、orjson の有無でダイジェストが変わってはいけない
+    _CANONICAL_ENCODER = json.JSONEncoder(
+        sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str
+    )
+
+    @staticmethod
+    def _encode_float(value: float) -> bytes:
+        """float を orjson.dumps と同一のバイト列で表現する。
+
+        stdlib (repr) は 1e-07 / 1e+20 形式だが orjson は 1e-7 / 1e20 を
+        出力し、さらに 10^-5 台だけは指数表記ではなく小数展開する
+        (1e-05 → 0.00001)。payload_hash の永続化により両経路の一致が
+        必須なので、ここで揃える。"""
+        s = repr(value)
+        if "e" in s:
+            mantissa, exp_str = s.split("e")
+            exp = int(exp_str)
+            if exp == -5:
+                sign = "-" if mantissa.startswith("-") else ""
+                digits = mantissa.lstrip("-").replace(".", "")
+                s = f"{sign}0.0000{digits}"
+            else:
+                s = f"{mantissa}e{exp}"
+        return s.encode()
+
+    @classmethod
+    def _hash_canonical(cls, obj: Any, h) -> None:
+        """変動キーの除外と正規化 JSON エンコードを 1 パスで行い h に流し込む。
+
+        _strip_volatile でコピー木を作ってから serialize すると payload を
+        2 回走査して丸ごと複製することになる。ここではキーをスキップしつつ
+        orjson.dumps(OPT_SORT_KEYS) と同一のバイト列を直接ハッシュへ送る
+        (tests/test_payload_hash.py で等価性を検証している)。"""
+        if isinstance(obj, dict):
+            h.update(b"{")
+            first = True
+            for k in sorted(k for k in obj if k not in cls._VOLATILE_KEYS):
+                if first:
+                    first = False
+                else:
+                    h.update(b",")
+                h.update(json.dumps(k, ensure_ascii=False).encode("utf-8"))
+                h.update(b":")
+                cls._hash_canonical(obj[k], h)
+            h.update(b"}")
+        elif isinstance(obj, (list, tuple)):
+            h.update(b"[")
+            first = True
+            for item in obj:
+                if first:
+                    first = False
+                else:
+                    h.update(b",")
+                cls._hash_canonical(item, h)
+            h.update(b"]")
+        elif isinstance(obj, float):
+            h.update(cls._encode_float(obj))
+        else:
+            h.update(cls._CANONICAL_ENCODER.encode(obj).encode("utf-8"))
+
     @classmethod
     def _payload_hash(cls, payload: Any) -> str:
         """payload の SHA-256 ハッシュを返す（重複検知用）。
-        変動するタイムスタンプ系キーを除外してから計算する。"""
-        stable = cls._strip_volatile(payload)
-        canonical = json.dumps(stable, sort_keys=True, ensure_ascii=False, default=str)
-        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+        変動するタイムスタンプ系キーを除外してから計算する。
+
+        orjson があれば Rust 実装のシリアライザに任せる (bytes を直接返すので
+        encode 不要)。無い環境では Python 再帰の _hash_canonical を使う。
+        ハッシュは payload_hash 列として DB に永続化されるため、両経路は
+        同一 payload に対して同一ダイジェストを返す必要がある。"""
+        if orjson is not None:
+            stable = cls._strip_volatile(payload)
+            canonical = orjson.dumps(
+                stable,
+                option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS,
+                default=str,
+            )
+            return hashlib.sha256(canonical).hexdigest()
+        h = hashlib.sha256()
+        cls._hash_canonical(payload, h)
+        return h.hexdigest()
 
     @staticmethod
     def _extract_recorded_at(payload: Any, fallback: datetime) -> str:
@@ -782,18 +1293,27 @@ class DatabaseManager:
         if not isinstance(payload, dict):
             return fallback.isoformat()
 
+        # 候補キーが 1 つも無い payload は 8 回の .get を踏まずに即 fallback
+        keys = payload.keys()
+        if _TS_KEYS.isdisjoint(keys):
+            return fallback.isoformat()
+
         # Unix epoch 系キー (dt, timestamp, ts, t, time)
-        for key in ("dt", "timestamp", "ts", "t", "time"):
-            val = payload.get(key)
+        for key in _EPOCH_KEYS:
+            if key not in keys:
+                continue
+            val = payload[key]
             if isinstance(val, (int, float)) and val > 1_000_000_000:
                 try:
-                    return datetime.fromtimestamp(val, tz=JST).isoformat()
+                    return _epoch_to_jst_iso(val)
                 except (OSError, ValueError):
                     continue
 
         # ISO 文字列系キー (recorded_at, date, day)
-        for key in ("recorded_at", "date", "day"):
-            val = payload.get(key)
+        for key in _ISO_KEYS:
+            if key not in keys:
+                continue
+            val = payload[key]
             if isinstance(val, str) and len(val) >= 10:
                 try:
                     dt = datetime.fromisoformat(val.replace("Z", "+00:00"))
@@ -808,43 +1328,101 @@ class DatabaseManager:
 
         return fallback.isoformat()
 
+    def _cached_hash_matches(self, key: tuple, new_hash: str) -> bool:
+        """直近に保存した payload ハッシュと一致すれば True (期限内のみ)"""
+        if self._hash_cache_ttl <= 0:
+            return False
+        entry = self._latest_hash.get(key)
+        return entry is not None and entry[0] == new_hash and time.monotonic() < entry[1]
+
+    def _remember_hash(self, key: tuple, new_hash: str) -> None:
+        if self._hash_cache_ttl > 0:
+            self._latest_hash[key] = (new_hash, time.monotonic() + self._hash_cache_ttl)
+
     def save_raw_data(self, user_id: str, source: str,
                       category: str, payload: Any, **_kwargs):
         """raw_data_lake にハッシュガード付きで INSERT する。
-        
+
         制約: unique_raw_data_v2 (user_id, fetched_at, source, category)
         ロジック:
-          1. 同一 source/category の最新50件の payload ハッシュと比較
-          2. 中身が同じものが1つでもあれば → スキップ（重複防止）
-          3. 中身が異なる → 新規 INSERT（fetched_at = now）
+          1. save_if_changed RPC で重複チェック + INSERT を 1 往復で実行
+             (docs/schema/save_if_changed.sql)
+          2. RPC が無い環境では従来どおり SELECT + ハッシュ比較 + INSERT の
+             2 往復にフォールバック
         """
         try:
             new_payload = payload if isinstance(payload, dict) else self._parse_raw_data(payload)
             new_hash = self._payload_hash(new_payload)
-            
-            # 同一 source/category の最新50件を取得
-            existing = (
-                self.supabase.table("raw_data_lake")
-                .select("id, payload")
-                .eq("user_id", user_id)
-                .eq("source", source)
-                .eq("category", category)
-                .order("fetched_at", desc=True)
-                .limit(50)
-                .execute()
-            )
-            
-            if existing.data:
+
+            # 直前に保存した内容と同じなら往復せずにスキップ
+            cache_key = (user_id, source, category)
+            if self._cached_hash_matches(cache_key, new_hash):
+                logger.info(f"Skipped duplicate for {source}/{category} (hash cache)")
+                return
+
+            now = _now_jst()
+            recorded_at = self._extract_recorded_at(new_payload, now)
+
+            try:
+                inserted = self.supabase.rpc("save_if_changed", {
+                    "_user_id": user_id,
+                    "_source": source,
+                    "_category": category,
+                    "_payload": new_payload,
+                    "_payload_hash": new_hash,
+                    "_recorded_at": recorded_at,
+                }).execute()
+                if inserted.data:
+                    logger.info(f"save_raw_data INSERT: {source}/{category}")
+                else:
+                    logger.info(f"Skipped duplicate for {source}/{category}")
+                self._remember_hash(cache_key, new_hash)
+                return
+            except Exception as e:
+                logger.info(f"save_if_changed RPC unavailable, falling back: {e}")
+
+            # 同一 source/category の最新50件のハッシュを取得。
+            # payload_hash 列があれば 64 バイトのダイジェストだけを引き、
+            # payload の再取得・再ハッシュを省く
+            existing_hashes = None
+            try:
+                existing = (
+                    self.supabase.table("raw_data_lake")
+                    .select("payload_hash")
+                    .eq("user_id", user_id)
+                    .eq("source", source)
+                    .eq("category", category)
+                    .order("fetched_at", desc=True)
+                    .limit(50)
+                    .execute()
+                )
+                # バックフィル前の NULL 行が混ざる場合は payload から再計算
+                if all(row.get("payload_hash") for row in existing.data):
+                    existing_hashes = {row["payload_hash"] for row in existing.data}
+            except Exception as e:
+                logger.info(f"payload_hash column unavailable, rehashing payloads: {e}")
+
+            if existing_hashes is None:
+                existing = (
+                    self.supabase.table("raw_data_lake")
+                    .select("id, payload")
+                    .eq("user_id", user_id)
+                    .eq("source", source)
+                    .eq("category", category)
+                    .order("fetched_at", desc=True)
+                    .limit(50)
+                    .execute()
+                )
                 existing_hashes = {
                     self._payload_hash(row.get("payload", {}))
                     for row in existing.data
                 }
-                if new_hash in existing_hashes:
-                    logger.info(f"Skipped duplicate for {source}/{category}")
-                    return
-            
-            now = _now_jst()
-            recorded_at = self._extract_recorded_at(new_payload, now)
+
+            if new_hash in existing_hashes:
+                logger.info(f"Skipped duplicate for {source}/{category}")
+                self._remember_hash(cache_key, new_hash)
+                return
+
             data = {
                 "user_id": user_id,
                 "fetched_at": now.isoformat(),
@@ -853,11 +1431,118 @@ class DatabaseManager:
                 "category": category,
                 "payload": new_payload,
             }
-            self.supabase.table("raw_data_lake").insert(data).execute()
+            # payload_hash 列が無い環境 (マイグレーション前) では外して再試行
+            try:
+                self.supabase.table("raw_data_lake").insert({**data, "payload_hash": new_hash}).execute()
+            except Exception as e:
+                logger.info(f"insert retry without payload_hash: {e}")
+                self.supabase.table("raw_data_lake").insert(data).execute()
+            self._remember_hash(cache_key, new_hash)
             logger.info(f"save_raw_data INSERT: {source}/{category}")
         except Exception as e:
             logger.warning(f"save_raw_data failed: source={source}, category={category}, error={e}")
-    
+
+    # 1 回の insert に載せる最大行数 (バッチ API の往復回数と
+    # リクエストサイズのバランス点)
+    RAW_INSERT_BATCH = 32
+
+    def save_raw_data_many(self, items: List[Dict[str, Any]]) -> int:
+        """複数レコードを重複除外のうえ raw_data_lake にまとめて INSERT する。
+
+        各 item は {"user_id", "source", "category", "payload"}。
+        save_raw_data をループで呼ぶと 1 レコードごとに HTTP 往復が発生する。
+        ここでは既存ハッシュの取得を 1 クエリにまとめ、残りを
+        RAW_INSERT_BATCH 件ずつの insert で流す。戻り値は INSERT した件数。
+        """
+        if not items:
+            return 0
+        try:
+            prepared = []
+            for item in items:
+                payload = item["payload"]
+                new_payload = payload if isinstance(payload, dict) else self._parse_raw_data(payload)
+                prepared.append((
+                    item["user_id"], item["source"], item["category"],
+                    new_payload, self._payload_hash(new_payload),
+                ))
+
+            # 既存ハッシュを 1 クエリで取得 (user × source × category の直近分)。
+            # user_id で絞らないと他ユーザーの行が limit 予算を食い潰す
+            users = sorted({p[0] for p in prepared})
+            sources = sorted({p[1] for p in prepared})
+            categories = sorted({p[2] for p in prepared})
+            groups = {(p[0], p[1], p[2]) for p in prepared}
+            existing = (
+                self.supabase.table("raw_data_lake")
+                .select("user_id, source, category, payload")
+                .in_("user_id", users)
+                .in_("source", sources)
+                .in_("category", categories)
+                .order("fetched_at", desc=True)
+                .limit(50 * len(groups))
+                .execute()
+            )
+            known = {
+                (row.get("user_id"), row.get("source"), row.get("category"),
+                 self._payload_hash(row.get("payload", {})))
+                for row in existing.data
+            }
+
+            # unique_raw_data_v2 (user_id, fetched_at, source, category) に
+            # 触れないよう、同一バッチ内では fetched_at を 1µs ずつずらす
+            base = _now_jst()
+            rows = []
+            row_keys = []  # rows と同じ並びの (キャッシュキー, ハッシュ)
+            seen = set()
+            for i, (uid, source, category, new_payload, new_hash) in enumerate(prepared):
+                key = (uid, source, category, new_hash)
+                if key in known:
+                    # DB に既存の重複。キャッシュにも覚えて次回の往復を省く
+                    self._remember_hash((uid, source, category), new_hash)
+                    continue
+                if key in seen or self._cached_hash_matches((uid, source, category), new_hash):
+                    continue
+                seen.add(key)
+                now = base + timedelta(microseconds=i)
+                rows.append({
+                    "user_id": uid,
+                    "fetched_at": now.isoformat(),
+                    "recorded_at": self._extract_recorded_at(new_payload, now),
+                    "source": source,
+                    "category": category,
+                    "payload": new_payload,
+                    "payload_hash": new_hash,
+                })
+                row_keys.append(((uid, source, category), new_hash))
+
+            inserted = 0
+            include_hash = True
+            for start in range(0, len(rows), self.RAW_INSERT_BATCH):
+                chunk = rows[start:start + self.RAW_INSERT_BATCH]
+                if not include_hash:
+                    chunk = [{k: v for k, v in row.items() if k != "payload_hash"} for row in chunk]
+                try:
+                    self.supabase.table("raw_data_lake").insert(chunk).execute()
+                except Exception as e:
+                    if not include_hash:
+                        raise
+                    # payload_hash 列が無い環境 (マイグレーション前) では外して再試行
+                    logger.info(f"bulk insert retry without payload_hash: {e}")
+                    include_hash = False
+                    chunk = [{k: v for k, v in row.items() if k != "payload_hash"} for row in chunk]
+                    self.supabase.table("raw_data_lake").insert(chunk).execute()
+                # INSERT が成功した行だけキャッシュに記録する。先に記録すると
+                # 失敗時でも TTL 内の再試行が「重複」としてスキップされてしまう
+                for cache_key, new_hash in row_keys[start:start + self.RAW_INSERT_BATCH]:
+                    self._remember_hash(cache_key, new_hash)
+                inserted += len(chunk)
+            if inserted or len(items):
+                logger.info(f"save_raw_data_many: inserted={inserted}, skipped={len(items) - inserted}")
+            return inserted
+        except Exception as e:
+            logger.warning(f"save_raw_data_many failed: error={e}")
+            return 0
+
     def save_token(self, user_id: str, provider: str, token_data: Dict[str, Any]):
         """OAuth トークンを upsert (insert or update) する"""
         data = {
@@ -890,13 +1575,22 @@ class DatabaseManager:
         raise NotImplementedError("Direct SQL queries are not supported with Supabase. Use table methods instead.")
     
     def _parse_raw_data(self, raw_data: Any) -> Any:
+        # Supabase 経由の payload はほぼ常に素の dict。type() is の
+        # ポインタ比較 1 回で返し、isinstance の MRO 探索を避ける
+        t = type(raw_data)
+        if t is dict:
+            return raw_data
         if raw_data is None:
             return None
-        if isinstance(raw_data, dict):
-            return raw_data
-        if isinstance(raw_data, str):
+        if t is str:
             try:
+                # 取り込みループでは同一ブロブが繰り返し流れてくるため、
+                # 短い文字列はパース結果をキャッシュする
+                if len(raw_data) < _PARSE_CACHE_MAX_LEN:
+                    return _cached_loads(raw_data)
+                if orjson is not None:
+                    return orjson.loads(raw_data)
                 return json.loads(raw_data)
-            except (json.JSONDecodeError, TypeError):
+            except (TypeError, ValueError):
                 return raw_data
         return raw_data
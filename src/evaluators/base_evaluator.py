@@ -6,7 +6,10 @@ class BaseEvaluator(ABC):
     """
     健康データを評価するための抽象基底クラス
     """
-    
+
+    # サブクラスで __slots__ を有効にするため基底側も宣言しておく
+    __slots__ = ("config",)
+
     def __init__(self, config: Dict[str, Any]):
         self.config = config
     
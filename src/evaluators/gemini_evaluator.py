@@ -1,10 +1,14 @@
+import hashlib
 import json
-import yaml
+import os
+import time
 import streamlit as st
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, Optional, List
 from pathlib import Path
 from src.evaluators.base_evaluator import BaseEvaluator
 from src.utils.secrets_loader import load_secrets
+from src.utils.yaml_cache import clear_cache as _clear_yaml_cache, load_yaml_cached as _load_yaml
 
 try:
     import google.generativeai as genai
@@ -12,19 +16,128 @@ try:
 except ImportError:
     GENAI_AVAILABLE = False
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _dumps_payloads(payloads: Any) -> str:
+    """プロンプト埋め込み用の JSON 文字列化 (orjson があれば Rust 実装)"""
+    if orjson is not None:
+        return orjson.dumps(payloads, default=str).decode()
+    return json.dumps(payloads, ensure_ascii=False, default=str)
+
+
+# 同一プロンプトに対する Gemini 応答のプロセス内キャッシュ。
+# リランや cron の再実行で同じデータを投げ直すと 1-3 秒の課金付き
+# ラウンドトリップになるため、model 名 + プロンプトの sha256 をキーに
+# TTL 付きで応答文字列を持つ。GEMINI_CACHE_TTL=0 で無効化できる。
+_RESPONSE_CACHE: Dict[str, tuple] = {}
+_RESPONSE_CACHE_MAX = 64
+
+try:
+    _RESPONSE_CACHE_TTL = float(os.environ.get("GEMINI_CACHE_TTL", "21600"))
+except ValueError:
+    _RESPONSE_CACHE_TTL = 21600.0
+
+
+def _response_cache_key(model_name: str, prompt: str) -> str:
+    return hashlib.sha256(f"{model_name}\x00{prompt}".encode()).hexdigest()
+
+
+def _response_cache_get(key: str) -> Optional[str]:
+    if _RESPONSE_CACHE_TTL <= 0:
+        return None
+    entry = _RESPONSE_CACHE.get(key)
+    if entry is None:
+        return None
+    deadline, text = entry
+    if time.monotonic() >= deadline:
+        _RESPONSE_CACHE.pop(key, None)
+        return None
+    return text
+
+
+def _response_cache_set(key: str, text: str) -> None:
+    if _RESPONSE_CACHE_TTL <= 0:
+        return
+    if len(_RESPONSE_CACHE) >= _RESPONSE_CACHE_MAX:
+        # 一番古く入ったエントリから捨てる (dict は挿入順を保つ)
+        _RESPONSE_CACHE.pop(next(iter(_RESPONSE_CACHE)), None)
+    _RESPONSE_CACHE[key] = (time.monotonic() + _RESPONSE_CACHE_TTL, text)
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def _load_user_profile_cached() -> Dict[str, str]:
+    """st.secrets のユーザープロフィールを dict 化して返す。
+
+    st.secrets は AttrDict 風オブジェクトで属性探索が毎回走るため、
+    deep_analyze のたびに読み直さずリラン横断でキャッシュする。"""
+    try:
+        profile = st.secrets.get("user_profile", {})
+    except Exception:
+        profile = {}
+    return {
+        "age": profile.get("age", "不明"),
+        "gender": profile.get("gender", "不明"),
+        "location": profile.get("location", "不明"),
+        "occupation": profile.get("occupation", "不明"),
+        "concerns": profile.get("concerns", "特になし"),
+        "goals": profile.get("goals", "健康維持"),
+    }
+
+
+# デフォルト構成のパス。実行中に変わらないので Path をインスタンス
+# ごとに作り直さず使い回す。
+_DEFAULT_SECRETS_PATH = Path("config/secrets.yaml")
+_DEFAULT_SETTINGS_PATH = Path("config/settings.yaml")
+_DEFAULT_PROMPTS_PATH = Path("config/prompts.yaml")
+_DEFAULT_PATHS = {
+    str(p): p
+    for p in (_DEFAULT_SECRETS_PATH, _DEFAULT_SETTINGS_PATH, _DEFAULT_PROMPTS_PATH)
+}
+
 
 class GeminiEvaluator(BaseEvaluator):
     """
     Google Gemini APIを使用した健康データ評価クラス
     """
-    
+
+    # インスタンスごとの __dict__ を持たせず属性アクセスを固定スロットにする
+    __slots__ = ("secrets_path", "settings_path", "prompts_path",
+                 "api_key", "model_name", "prompts", "model")
+
+    # Deep Insight プロンプトに埋め込む生データの上限。全件を indent 付きで
+    # 流し込むと 14 日分で 50-100KB に達し、入力トークンと TTFT を浪費する。
+    MAX_RECORDS_PER_SOURCE = 7
+
+    # source ごとにプロンプトで実際に参照されるフィールドだけ残す射影。
+    # DatabaseManager._PROMPT_PAYLOAD_FIELDS と対で、DB 側で射影済みでも
+    # フォールバック経路 (get_raw_data_by_date) の全量 payload を刈り込める。
+    KEEP_FIELDS = {
+        "oura": ("day", "score", "steps", "contributors", "total_sleep_duration"),
+        "withings": ("date", "weight", "measures"),
+        "weather": ("main", "weather", "wind"),
+        "switchbot": ("CO2", "temperature", "humidity", "body"),
+        "google_fit": ("data_type", "value", "date"),
+    }
+
+    # JSON ブロックの前に付ける数値サマリー (表示ラベル, payload キー)
+    _SUMMARY_KEYS = {
+        "oura": (("score", "score"), ("steps", "steps")),
+        "withings": (("weight", "weight"),),
+        "switchbot": (("CO2", "CO2"), ("室温", "temperature"), ("湿度", "humidity")),
+    }
+
+
     def __init__(self, config: Dict[str, Any], secrets_path: str = "config/secrets.yaml", 
                  settings_path: str = "config/settings.yaml", prompts_path: str = "config/prompts.yaml", 
                  model_name: Optional[str] = None):
         super().__init__(config)
-        self.secrets_path = Path(secrets_path)
-        self.settings_path = Path(settings_path)
-        self.prompts_path = Path(prompts_path)
+        self.secrets_path = _DEFAULT_PATHS.get(secrets_path) or Path(secrets_path)
+        self.settings_path = _DEFAULT_PATHS.get(settings_path) or Path(settings_path)
+        self.prompts_path = _DEFAULT_PATHS.get(prompts_path) or Path(prompts_path)
         self.api_key = self._load_api_key()
         self.model_name = model_name or self._load_model_name()
         self.prompts = self._load_prompts()
@@ -42,18 +155,15 @@ class GeminiEvaluator(BaseEvaluator):
     def _load_model_name(self) -> str:
         """設定ファイルからモデル名を読み込む"""
         try:
-            with open(self.settings_path, "r", encoding="utf-8") as f:
-                settings = yaml.safe_load(f)
-                return settings.get("gemini", {}).get("model_name", "gemini-1.5-flash")
+            settings = _load_yaml(self.settings_path)
+            return settings.get("gemini", {}).get("model_name", "gemini-1.5-flash")
         except Exception:
             return "gemini-1.5-flash"
     
     def _load_prompts(self) -> Dict[str, str]:
         """プロンプトテンプレートを読み込む"""
         try:
-            with open(self.prompts_path, "r", encoding="utf-8") as f:
-                prompts_data = yaml.safe_load(f)
-                return prompts_data
+            return _load_yaml(self.prompts_path)
         except Exception:
             return {
                 "logical": {
@@ -75,19 +185,14 @@ class GeminiEvaluator(BaseEvaluator):
     
     @staticmethod
     def _load_user_profile() -> Dict[str, str]:
-        """ユーザープロフィールを st.secrets から読み込む"""
-        try:
-            profile = st.secrets.get("user_profile", {})
-        except Exception:
-            profile = {}
-        return {
-            "age": profile.get("age", "不明"),
-            "gender": profile.get("gender", "不明"),
-            "location": profile.get("location", "不明"),
-            "occupation": profile.get("occupation", "不明"),
-            "concerns": profile.get("concerns", "特になし"),
-            "goals": profile.get("goals", "健康維持"),
-        }
+        """ユーザープロフィールを st.secrets から読み込む (1 時間キャッシュ)"""
+        return _load_user_profile_cached()
+
+    @classmethod
+    def evict_caches(cls) -> None:
+        """テスト用: YAML キャッシュと Gemini 応答キャッシュを破棄する"""
+        _clear_yaml_cache()
+        _RESPONSE_CACHE.clear()
 
     def is_available(self) -> bool:
         """評価機能が利用可能か確認"""
@@ -104,16 +209,36 @@ class GeminiEvaluator(BaseEvaluator):
         Returns:
             str: 生成されたフィードバックテキスト
         """
+        return "".join(self.evaluate_stream(data, mode))
+
+    def evaluate_stream(self, data: Dict[str, Any], mode: str = "logical"):
+        """evaluate のストリーミング版。生成テキストをチャンク単位で yield する。
+
+        UI 側は st.write_stream 等で逐次描画でき、最初のトークンまでの
+        待ち時間が全文生成の完了待ちから数百 ms に縮む。
+        """
         if not self.is_available():
-            return "⚠️ Gemini APIが利用できません。APIキーを設定してください。"
-        
+            yield "⚠️ Gemini APIが利用できません。APIキーを設定してください。"
+            return
+
         prompt = self._build_prompt(data, mode)
-        
+        cache_key = _response_cache_key(self.model_name, prompt)
+        cached = _response_cache_get(cache_key)
+        if cached is not None:
+            yield cached
+            return
+
+        parts = []
         try:
-            response = self.model.generate_content(prompt)
-            return response.text
+            for chunk in self.model.generate_content(prompt, stream=True):
+                text = getattr(chunk, "text", "")
+                if text:
+                    parts.append(text)
+                    yield text
         except Exception as e:
-            return f"❌ 評価中にエラーが発生しました: {str(e)}"
+            yield f"❌ 評価中にエラーが発生しました: {str(e)}"
+            return
+        _response_cache_set(cache_key, "".join(parts))
     
     def _build_prompt(self, data: Dict[str, Any], mode: str) -> str:
         """
@@ -143,12 +268,16 @@ class GeminiEvaluator(BaseEvaluator):
         """体重データを整形"""
         if not weight_data:
             return "体重データ: なし"
-        
+
         latest = weight_data[0] if weight_data else None
         if latest:
+            weights = self._col(weight_data[:7], "weight_kg")
+            # weight_data は新しい順なので時系列に戻して集約する
+            avg, slope = self._stats(weights[::-1])
+            trend_line = f"\n- 直近7日傾向: {slope:+.2f}kg/日" if weights.size >= 2 else ""
             return f"""体重データ:
 - 最新体重: {latest.get('weight_kg', 'N/A')}kg ({latest.get('measured_at', 'N/A')})
-- 直近7日平均: {self._calculate_average(weight_data[:7], 'weight_kg'):.1f}kg
+- 直近7日平均: {avg:.1f}kg{trend_line}
 - データ件数: {len(weight_data)}件"""
         return "体重データ: 利用可能なデータなし"
     
@@ -168,10 +297,55 @@ class GeminiEvaluator(BaseEvaluator):
 - データ件数: {len(oura_data)}件"""
         return "Oura Ringデータ: 利用可能なデータなし"
     
+    @staticmethod
+    def _col(data: list, key: str):
+        """dict リストから数値列を NumPy 配列として抽出する (SoA 化)"""
+        import numpy as np
+
+        return np.fromiter(
+            (item[key] for item in data if item.get(key) is not None),
+            dtype=np.float64,
+        )
+
+    @staticmethod
+    def _stats(values) -> tuple:
+        """時系列順の数値配列から (平均, 1 日あたりの傾き) をまとめて計算する。
+
+        縮約はすべて NumPy の C ループで走るので、レコード数が数百件に
+        増えても Python レベルの反復は配列抽出の 1 回だけで済む。"""
+        import numpy as np
+
+        if values.size == 0:
+            return 0.0, 0.0
+        mean = float(values.mean())
+        slope = 0.0
+        if values.size >= 2:
+            slope = float(np.polyfit(np.arange(values.size), values, 1)[0])
+        return mean, slope
+
+    @classmethod
+    def _summarize_source(cls, source: str, payloads: list) -> str:
+        """source ごとの数値フィールドを平均に集約した 1 行サマリーを返す"""
+        spec = cls._SUMMARY_KEYS.get(source)
+        if not spec or not payloads:
+            return ""
+        import numpy as np
+
+        parts = []
+        for label, key in spec:
+            values = np.fromiter(
+                (float(p[key]) for p in payloads
+                 if isinstance(p, dict) and isinstance(p.get(key), (int, float))),
+                dtype=np.float64,
+            )
+            if values.size:
+                parts.append(f"{label}平均={values.mean():.1f}")
+        return ", ".join(parts)
+
     def _calculate_average(self, data: list, key: str) -> float:
         """平均値を計算"""
-        values = [item.get(key, 0) for item in data if item.get(key) is not None]
-        return sum(values) / len(values) if values else 0
+        values = self._col(data, key)
+        return float(values.mean()) if values.size else 0.0
     
     def deep_analyze(self, raw_data_dict: Optional[Dict[str, List[Dict[str, Any]]]] = None,
                      target_model: Optional[str] = None, **kwargs) -> str:
@@ -186,15 +360,26 @@ class GeminiEvaluator(BaseEvaluator):
         Returns:
             str: AI による深層分析テキスト
         """
+        return "".join(self.deep_analyze_stream(raw_data_dict, target_model=target_model, **kwargs))
+
+    def deep_analyze_stream(self, raw_data_dict: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+                            target_model: Optional[str] = None, **kwargs):
+        """deep_analyze のストリーミング版。生成テキストをチャンク単位で yield する。
+
+        保存やレンダリングを全文完了待ちから切り離せるので、
+        長い分析でも最初の段落がすぐ画面に出せる。
+        """
         if not self.is_available():
-            return "⚠️ Gemini APIが利用できません。APIキーを設定してください。"
+            yield "⚠️ Gemini APIが利用できません。APIキーを設定してください。"
+            return
 
         # 呼び出し側互換: raw_data キーで渡された場合も受け付ける
         if raw_data_dict is None and isinstance(kwargs.get("raw_data"), dict):
             raw_data_dict = kwargs.get("raw_data")
-        
+
         if not raw_data_dict:
-            return "⚠️ 分析対象の生データがありません。まず🔄ボタンでデータを更新してください。"
+            yield "⚠️ 分析対象の生データがありません。まず🔄ボタンでデータを更新してください。"
+            return
         
         # target_model が指定されていればそのモデルを使用、なければデフォルト
         model = self.model
@@ -211,8 +396,20 @@ class GeminiEvaluator(BaseEvaluator):
 
         data_sections = []
         for source, records in raw_data_dict.items():
-            payloads = [r.get("payload", {}) for r in records]
-            data_sections.append(f"### {source.upper()} (件数: {len(records)})\n```json\n{json.dumps(payloads, ensure_ascii=False, indent=1, default=str)}\n```")
+            keep = self.KEEP_FIELDS.get(source)
+            payloads = []
+            for r in records[:self.MAX_RECORDS_PER_SOURCE]:
+                payload = r.get("payload", {})
+                if keep and isinstance(payload, dict):
+                    payload = {k: payload[k] for k in keep if k in payload}
+                payloads.append(payload)
+            summary = self._summarize_source(source, payloads)
+            summary_line = f"\n## Summary: {summary}" if summary else ""
+            # indent 付き dumps はプロンプトのトークン数を 3 割ほど膨らませる
+            data_sections.append(
+                f"### {source.upper()} (件数: {len(records)}, 掲載: {len(payloads)}){summary_line}\n"
+                f"```json\n{_dumps_payloads(payloads)}\n```"
+            )
         
         raw_data_text = "\n\n".join(data_sections)
 
@@ -243,8 +440,97 @@ class GeminiEvaluator(BaseEvaluator):
 摂取成分サマリーがある場合は、過不足やタイミングの観点も考慮してください。
 口調はフランクで親しみやすく、励ますようにしてください。"""
         
+        cache_key = _response_cache_key(target_model or self.model_name, prompt)
+        cached = _response_cache_get(cache_key)
+        if cached is not None:
+            yield cached
+            return
+
+        parts = []
+        try:
+            for chunk in model.generate_content(prompt, stream=True):
+                text = getattr(chunk, "text", "")
+                if text:
+                    parts.append(text)
+                    yield text
+        except Exception as e:
+            yield f"❌ Deep Insight 分析中にエラーが発生しました: {str(e)}"
+            return
+        _response_cache_set(cache_key, "".join(parts))
+
+    def _build_source_prompt(self, source: str, records: List[Dict[str, Any]]) -> str:
+        """source 単体のサブ分析プロンプトを構築する"""
+        keep = self.KEEP_FIELDS.get(source)
+        payloads = []
+        for r in records[:self.MAX_RECORDS_PER_SOURCE]:
+            payload = r.get("payload", {})
+            if keep and isinstance(payload, dict):
+                payload = {k: payload[k] for k in keep if k in payload}
+            payloads.append(payload)
+        return (f"あなたはヘルスコーチです。以下は直近の {source} のデータです。\n"
+                f"```json\n{_dumps_payloads(payloads)}\n```\n"
+                "このデータから読み取れる重要な気づきを、日本語の箇条書きで2〜3点、簡潔に挙げてください。")
+
+    @staticmethod
+    def _analyze_one(model, prompt: str) -> str:
+        try:
+            return model.generate_content(prompt).text
+        except Exception as e:
+            return f"(分析失敗: {e})"
+
+    def deep_analyze_concurrent(self, raw_data_dict: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+                                target_model: Optional[str] = None, **kwargs) -> str:
+        """source ごとのサブ分析を並行実行してから統合する deep_analyze の派生版。
+
+        モノリシックな 1 プロンプトの代わりに source 単位の小プロンプトを
+        スレッドで同時に投げ、結果を最後に 1 回のマージ呼び出しでまとめる。
+        API 呼び出しは N+1 回に増えるが、壁時計時間は直列の約 1/N になる。
+        """
+        if not self.is_available():
+            return "⚠️ Gemini APIが利用できません。APIキーを設定してください。"
+
+        if raw_data_dict is None and isinstance(kwargs.get("raw_data"), dict):
+            raw_data_dict = kwargs.get("raw_data")
+
+        if not raw_data_dict:
+            return "⚠️ 分析対象の生データがありません。まず🔄ボタンでデータを更新してください。"
+
+        model = self.model
+        if target_model and target_model != self.model_name:
+            try:
+                model = genai.GenerativeModel(target_model)
+            except Exception:
+                model = self.model
+
+        sources = list(raw_data_dict.items())
+        with ThreadPoolExecutor(max_workers=len(sources)) as executor:
+            futures = [
+                executor.submit(self._analyze_one, model, self._build_source_prompt(source, records))
+                for source, records in sources
+            ]
+            sections = [
+                f"### {source.upper()}\n{future.result()}"
+                for (source, _), future in zip(sources, futures)
+            ]
+
+        profile = self._load_user_profile()
+        merge_prompt = f"""あなたは、以下のユーザーの専属ヘルスコーチです。
+
+【ユーザー情報】
+- 年齢: {profile['age']}
+- 性別: {profile['gender']}
+- 現在の悩み: {profile['concerns']}
+- 目標: {profile['goals']}
+
+【データソース別の分析結果】
+{chr(10).join(sections)}
+
+【依頼】
+上記のソース別分析を統合し、ユーザーの悩みや目標に寄り添った、
+具体的かつ実践的なアドバイスを3点提示してください。
+口調はフランクで親しみやすく、励ますようにしてください。"""
+
         try:
-            response = model.generate_content(prompt)
-            return response.text
+            return model.generate_content(merge_prompt).text
         except Exception as e:
             return f"❌ Deep Insight 分析中にエラーが発生しました: {str(e)}"
@@ -1,5 +1,6 @@
 import logging
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta, timezone
 from src.base_fetcher import BaseFetcher
@@ -19,6 +20,10 @@ class OuraFetcher(BaseFetcher):
         self.secrets = load_secrets(secrets_path)
         oura_config = self.secrets.get("oura", {})
         self.personal_token = oura_config.get("personal_token", "")
+        # keep-alive で 3 エンドポイント分の TLS ハンドシェイクを 1 回に
+        # まとめる共有セッション
+        self.session = requests.Session()
+        self.session.headers["Authorization"] = f"Bearer {self.personal_token}"
     
     def authenticate(self) -> bool:
         return bool(self.personal_token) and self.personal_token != "your_oura_personal_token"
@@ -40,9 +45,15 @@ class OuraFetcher(BaseFetcher):
         start_str = start.strftime("%Y-%m-%d")
         end_str = end.strftime("%Y-%m-%d")
         
-        daily_activity = self._fetch_daily_activity(start_str, end_str)
-        daily_sleep = self._fetch_daily_sleep(start_str, end_str)
-        daily_readiness = self._fetch_daily_readiness(start_str, end_str)
+        # 3 エンドポイントは独立した I/O 待ちなので並行に投げる
+        # (直列の 3×RTT → 約 1×RTT)
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            future_activity = executor.submit(self._fetch_daily_activity, start_str, end_str)
+            future_sleep = executor.submit(self._fetch_daily_sleep, start_str, end_str)
+            future_readiness = executor.submit(self._fetch_daily_readiness, start_str, end_str)
+            daily_activity = future_activity.result()
+            daily_sleep = future_sleep.result()
+            daily_readiness = future_readiness.result()
         
         # Data Lake: 生データを解析前に保存
         self._save_to_data_lake(user_id, daily_activity, "activity")
@@ -60,70 +71,39 @@ class OuraFetcher(BaseFetcher):
         if not self.db_manager:
             logger.info("OuraFetcher: db_manager is None, skipping save")
             return
-        for item in raw_response.get("data", []):
-            self.db_manager.save_raw_data(
-                user_id=user_id,
-                source="oura",
-                category=category,
-                payload=item,
-            )
+        items = [
+            {"user_id": user_id, "source": "oura", "category": category, "payload": item}
+            for item in raw_response.get("data", [])
+        ]
+        if items:
+            # レコードごとの往復を避け、まとめて INSERT する
+            self.db_manager.save_raw_data_many(items)
     
-    def _fetch_daily_activity(self, start_date: str, end_date: str) -> Dict[str, Any]:
-        url = f"{self.API_BASE_URL}/daily_activity"
-        
+    def _fetch_endpoint(self, endpoint: str, start_date: str, end_date: str) -> Dict[str, Any]:
+        url = f"{self.API_BASE_URL}/{endpoint}"
+
         params = {
             "start_date": start_date,
             "end_date": end_date
         }
-        
-        headers = {
-            "Authorization": f"Bearer {self.personal_token}"
-        }
-        
+
         try:
-            response = requests.get(url, params=params, headers=headers)
+            # 認証ヘッダーは self.session に設定済み。requests.Session は
+            # スレッドセーフに GET できるので並行呼び出しでも共有できる。
+            response = self.session.get(url, params=params)
             response.raise_for_status()
             return response.json()
         except Exception:
             return {"data": []}
-    
+
+    def _fetch_daily_activity(self, start_date: str, end_date: str) -> Dict[str, Any]:
+        return self._fetch_endpoint("daily_activity", start_date, end_date)
+
     def _fetch_daily_sleep(self, start_date: str, end_date: str) -> Dict[str, Any]:
-        url = f"{self.API_BASE_URL}/daily_sleep"
-        
-        params = {
-            "start_date": start_date,
-            "end_date": end_date
-        }
-        
-        headers = {
-            "Authorization": f"Bearer {self.personal_token}"
-        }
-        
-        try:
-            response = requests.get(url, params=params, headers=headers)
-            response.raise_for_status()
-            return response.json()
-        except Exception:
-            return {"data": []}
-    
+        return self._fetch_endpoint("daily_sleep", start_date, end_date)
+
     def _fetch_daily_readiness(self, start_date: str, end_date: str) -> Dict[str, Any]:
-        url = f"{self.API_BASE_URL}/daily_readiness"
-        
-        params = {
-            "start_date": start_date,
-            "end_date": end_date
-        }
-        
-        headers = {
-            "Authorization": f"Bearer {self.personal_token}"
-        }
-        
-        try:
-            response = requests.get(url, params=params, headers=headers)
-            response.raise_for_status()
-            return response.json()
-        except Exception:
-            return {"data": []}
+        return self._fetch_endpoint("daily_readiness", start_date, end_date)
     
     def _parse_oura_data(self, activity: Dict[str, Any], sleep: Dict[str, Any], 
                         readiness: Dict[str, Any], user_id: str) -> List[Dict[str, Any]]:
@@ -57,13 +57,13 @@ class WithingsFetcher(BaseFetcher):
             return
         if raw_response.get("status") != 0:
             return
-        for grp in raw_response.get("body", {}).get("measuregrps", []):
-            self.db_manager.save_raw_data(
-                user_id=user_id,
-                source="withings",
-                category="measure",
-                payload=grp,
-            )
+        items = [
+            {"user_id": user_id, "source": "withings", "category": "measure", "payload": grp}
+            for grp in raw_response.get("body", {}).get("measuregrps", [])
+        ]
+        if items:
+            # 測定グループごとの往復を避け、まとめて INSERT する
+            self.db_manager.save_raw_data_many(items)
     
     def _fetch_measurements(self, startdate: int, enddate: int) -> Dict[str, Any]:
         url = f"{self.API_BASE_URL}/measure"
@@ -7,10 +7,11 @@
 両者を再帰的にディープマージし、st.secrets 側の値が優先される。
 """
 import logging
-import yaml
 from pathlib import Path
 from typing import Any, Dict
 
+from src.utils.yaml_cache import load_yaml_cached
+
 logger = logging.getLogger(__name__)
 
 _SETTINGS_PATH = Path("config/settings.yaml")
@@ -28,10 +29,13 @@ def _deep_merge(base: Dict[str, Any], override: Dict[str, Any]) -> Dict[str, Any
 
 
 def _load_yaml_settings(path: Path = _SETTINGS_PATH) -> Dict[str, Any]:
-    """settings.yaml を読み込む。ファイルが無ければ空辞書。"""
+    """settings.yaml を読み込む。ファイルが無ければ空辞書。
+
+    parse 結果は mtime キーでキャッシュされ、リランごとの再パースを
+    避ける (src/utils/yaml_cache.py)。
+    """
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            return yaml.safe_load(f) or {}
+        return load_yaml_cached(path) or {}
     except FileNotFoundError:
         logger.warning("config/settings.yaml not found — using defaults")
         return {}
@@ -0,0 +1,59 @@
+"""OAuth トークンのプロセス内共有キャッシュ。
+
+cache_resource 外で生成された OAuth インスタンスや複数ページが、
+同じユーザーのトークンをそれぞれ Supabase から読み直すのを防ぐ。
+キーは sha256(provider|user_id|client_id) で、TTL は残り有効時間から
+300 秒のマージンを引いた値。期限切れ間際のヒットで古いトークンを
+掴まないようにしている。
+"""
+
+import hashlib
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+# キャッシュ TTL を残り有効時間よりこの秒数だけ短くする
+TTL_MARGIN_SECONDS = 300
+
+_LOCK = threading.RLock()
+_CACHE: Dict[str, Tuple[Dict[str, Any], float]] = {}
+
+
+def make_key(provider: str, user_id: str, client_id: str) -> str:
+    return hashlib.sha256(f"{provider}|{user_id}|{client_id}".encode()).hexdigest()
+
+
+def get(key: str) -> Optional[Dict[str, Any]]:
+    """キャッシュされたトークン dict を返す。期限切れなら捨てて None。"""
+    with _LOCK:
+        entry = _CACHE.get(key)
+        if entry is None:
+            return None
+        tokens, deadline = entry
+        if time.monotonic() >= deadline:
+            del _CACHE[key]
+            return None
+        return tokens
+
+
+def put(key: str, tokens: Dict[str, Any], remaining_seconds: Optional[float]) -> None:
+    """トークンをキャッシュする。残り有効時間が短すぎる場合は載せない。"""
+    if remaining_seconds is None:
+        return
+    ttl = float(remaining_seconds) - TTL_MARGIN_SECONDS
+    if ttl <= 0:
+        invalidate(key)
+        return
+    with _LOCK:
+        _CACHE[key] = (tokens, time.monotonic() + ttl)
+
+
+def invalidate(key: str) -> None:
+    with _LOCK:
+        _CACHE.pop(key, None)
+
+
+def clear() -> None:
+    """全エントリを破棄する (テスト用)。"""
+    with _LOCK:
+        _CACHE.clear()
@@ -1,3 +1,4 @@
+import functools
 import os
 import re
 import yaml
@@ -10,7 +11,16 @@ def load_secrets(secrets_path: str = "config/secrets.yaml") -> Dict[str, Any]:
     1. 環境変数 (os.getenv) — パブリックリポジトリ / CI / Streamlit Cloud 向け
     2. YAML ファイル (config/secrets.yaml) — ローカル開発向け
     3. st.secrets — Streamlit Cloud TOML フォールバック
+
+    結果はパスごとに lru_cache されるので、OAuth クラスなどが
+    インスタンス生成のたびに呼んでも YAML の再パースは走らない。
     """
+    # realpath をキーにして同一ファイルへの別表記パスもまとめる
+    return _load_secrets_cached(os.path.realpath(secrets_path))
+
+
+@functools.lru_cache(maxsize=8)
+def _load_secrets_cached(secrets_path: str) -> Dict[str, Any]:
     # 1) YAML（ローカル）
     yaml_secrets: Dict[str, Any] = {}
     if os.path.exists(secrets_path):
@@ -1,7 +1,7 @@
 from pathlib import Path
 from typing import Any, Dict, List
 
-import yaml
+from src.utils.yaml_cache import load_yaml_cached
 
 _SUPPLEMENTS_PATH = Path("config/supplements.yaml")
 
@@ -9,14 +9,13 @@ _SUPPLEMENTS_PATH = Path("config/supplements.yaml")
 def load_supplements(path: Path = _SUPPLEMENTS_PATH) -> Dict[str, Any]:
     """Load supplements master YAML. Returns safe defaults if not found."""
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            loaded = yaml.safe_load(f) or {}
-            if not isinstance(loaded, dict):
-                return {"items": {}, "presets": {}}
-            return {
-                "items": loaded.get("items", {}) or {},
-                "presets": loaded.get("presets", {}) or {},
-            }
+        loaded = load_yaml_cached(path) or {}
+        if not isinstance(loaded, dict):
+            return {"items": {}, "presets": {}}
+        return {
+            "items": loaded.get("items", {}) or {},
+            "presets": loaded.get("presets", {}) or {},
+        }
     except FileNotFoundError:
         return {"items": {}, "presets": {}}
 
@@ -17,8 +17,17 @@ TABLE_NAME = "system_health_logs"
 
 def _connect(db_path: Path = DB_PATH) -> sqlite3.Connection:
     db_path.parent.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(db_path)
+    # 同じ SELECT/INSERT を繰り返すため、ステートメントキャッシュを
+    # デフォルト (128) より広げて再パースを避ける
+    conn = sqlite3.connect(db_path, cached_statements=256)
     conn.row_factory = sqlite3.Row
+    # WAL でサンプリング書き込み中もチャート読み出しをブロックしない。
+    # synchronous=NORMAL は WAL と組み合わせて fsync コストを下げる定番設定。
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA mmap_size=268435456")
+    conn.execute("PRAGMA cache_size=-8192")
     return conn
 
 
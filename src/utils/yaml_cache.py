@@ -0,0 +1,35 @@
+"""mtime キー付きの YAML 読み込みキャッシュ。
+
+Streamlit はリランのたびに evaluator や loader を作り直すため、同じ
+設定 YAML を何度も open + parse しがち。ここで (path, mtime_ns) を
+キーに parse 結果をキャッシュし、ファイルが編集されない限り 2 回目
+以降は stat 1 回で済ませる。
+"""
+import functools
+import os
+from typing import Any
+
+import yaml
+
+# libyaml があれば C 実装のローダーを使う (pure-Python の数倍速い)
+SAFE_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+@functools.lru_cache(maxsize=32)
+def _load_yaml_cached(path_str: str, mtime_ns: int) -> Any:
+    with open(path_str, "r", encoding="utf-8") as f:
+        return yaml.load(f, Loader=SAFE_LOADER)
+
+
+def load_yaml_cached(path) -> Any:
+    """path の YAML を parse して返す。mtime が変わるまでキャッシュされる。
+
+    ファイルが無ければ FileNotFoundError がそのまま上がる。返り値は
+    キャッシュ共有オブジェクトなので呼び出し側で書き換えないこと。
+    """
+    return _load_yaml_cached(str(path), os.stat(path).st_mtime_ns)
+
+
+def clear_cache() -> None:
+    """テスト用: キャッシュ済みの parse 結果を破棄する"""
+    _load_yaml_cached.cache_clear()
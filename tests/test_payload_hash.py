@@ -0,0 +1,56 @@
+import hashlib
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+orjson = pytest.importorskip("orjson")
+
+from src.database_manager import DatabaseManager
+
+
+# 実際の payload を模した代表的なケース。ネスト・非 ASCII・数値型・
+# 変動キー (_VOLATILE_KEYS) の混在をカバーする
+PAYLOADS = [
+    {},
+    {"score": 85, "day": "2026-08-27"},
+    {"b": 1, "a": 2, "c": {"z": None, "y": [1, 2.5, "三"], "x": True}},
+    {"temperature": 24.5, "humidity": 0.1, "CO2": 812, "body": {"flag": False}},
+    {"timestamp": 1700000000, "score": 70, "contributors": {"deep_sleep": 55}},
+    {"日本語キー": "値", "weather": [{"main": "Clouds"}, {"main": "Rain"}]},
+    ["plain", "list", 1, None],
+    "not-a-dict",
+    # 指数表記になる float: stdlib は 1e-07/1e+20、orjson は 1e-7/1e20 を
+    # 出力し、10^-5 台は小数展開 (0.00001) になる
+    {"f": 1e-7},
+    {"f": 1e20},
+    {"f": 1.5e-9},
+    {"f": -2.5e16},
+    {"f": 1e-5},
+    {"f": 2.5e-5},
+    {"f": -1.5212603486793025e-05},
+    {"values": [1e-7, 1e20, 9.999e-7, 1e-6, 0.1, 1e16]},
+]
+
+
+def _fallback_hash(payload):
+    """orjson 無し環境が通る _hash_canonical 経路でダイジェストを計算する"""
+    h = hashlib.sha256()
+    DatabaseManager._hash_canonical(payload, h)
+    return h.hexdigest()
+
+
+@pytest.mark.parametrize("payload", PAYLOADS)
+def test_fallback_hash_matches_orjson_path(payload):
+    """payload_hash は DB に永続化されるため、orjson 経路と
+    stdlib フォールバック経路が同一ダイジェストを返すことを保証する"""
+    assert DatabaseManager._payload_hash(payload) == _fallback_hash(payload)
+
+
+def test_volatile_keys_are_ignored_consistently():
+    base = {"score": 85, "day": "2026-08-27"}
+    with_volatile = {**base, "fetched_at": "2026-08-28T00:00:00+09:00", "timestamp": 1}
+    assert DatabaseManager._payload_hash(base) == DatabaseManager._payload_hash(with_volatile)
+    assert _fallback_hash(base) == _fallback_hash(with_volatile)
@@ -2,14 +2,22 @@
 Data fetching utilities for YuruHealth
 データ取得ロジック
 """
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any
 from src.database_manager import DatabaseManager
 
 
 def fetch_latest_data(db_manager: DatabaseManager, user_id: str = "user_001") -> Dict[str, Any]:
-    """最新の健康データを取得"""
-    weight_data = db_manager.get_weight_data(user_id=user_id, limit=30)
-    oura_data = db_manager.get_oura_data(user_id=user_id, limit=30)
+    """最新の健康データを取得。
+
+    weight / oura のクエリは独立なので並行に投げ、往復レイテンシを
+    直列に積まない (クエリ・ウォーターフォールの回避)。
+    """
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        weight_future = pool.submit(db_manager.get_weight_data, user_id=user_id, limit=30)
+        oura_future = pool.submit(db_manager.get_oura_data, user_id=user_id, limit=30)
+        weight_data = weight_future.result()
+        oura_data = oura_future.result()
     
     latest_weight = weight_data[0] if weight_data else None
     latest_oura = oura_data[0] if oura_data else None